@@ -0,0 +1,124 @@
+import argparse
+import copy
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from gen_dummy_test_files import generate_data  # type:ignore[import-not-found]
+from offer_queue import OfferQueue  # type:ignore[import-not-found]
+
+# Compares the offer selection of OfferQueue against the previous implementation
+# (re-calculate the price per card of every offer, sort the whole list and pop the first offer)
+# on data generated by gen_dummy_test_files.py. Checks that both select exactly the same offers.
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default 0).")
+    parser.add_argument("--num-sellers", type=int, default=2000, help="Number of sellers (default 2000).")
+    parser.add_argument("--num-cards", type=int, default=100, help="Number of cards (default 100).")
+    parser.add_argument("--card-min-offers", type=int, default=500, help="Min offers per card (default 500).")
+    parser.add_argument("--card-max-offers", type=int, default=1000, help="Max offers per card (default 1000).")
+    parser.add_argument("--offer-max-amount", type=int, default=2, help="Max copies per offer (default 2).")
+    parser.add_argument("--max-card-amount", type=int, default=4, help="Max amount needed per card (default 4).")
+    args = parser.parse_args()
+    return args
+
+
+def legacy_get_best_offer(
+    offers: list[dict[str, int | float | str]],
+    amount: int,
+    selected_sellers: set[str],
+    sellers_db_cards_available: dict[str, dict[str, int | float]],
+):
+    for offer in offers:
+        selected_amount = int(offer["amount"]) if amount >= int(offer["amount"]) else amount
+        offer["selected_amount"] = selected_amount
+        shipping_price = float(offer["shipping_price"]) if offer["seller"] not in selected_sellers else 0.0
+        total_price_selected_amount = round(float(offer["price"]) * selected_amount + shipping_price, 2)
+        offer["price_per_card"] = round(total_price_selected_amount / selected_amount, 2)
+    offers.sort(
+        key=lambda x: (x["price_per_card"], -int(sellers_db_cards_available[str(x["seller"])]["cards_available"])),
+    )
+    selected_offer = offers.pop(0)
+    selected_sellers.add(str(selected_offer["seller"]))
+    return selected_offer
+
+
+def select_offers(card_list, offers_database, sellers_db_cards_available, use_queue: bool):
+    selected_offers: dict[str, list[dict[str, int | float | str]]] = {}
+    selected_sellers: set[str] = set()
+    for card_name, amount in card_list.items():
+        selected_offers[card_name] = []
+        amount_left = amount
+        offer_queue = OfferQueue(offers_database[card_name], sellers_db_cards_available) if use_queue else None
+        while amount_left > 0:
+            if offer_queue is not None:
+                _, selected_offer = offer_queue.pop(amount_left, selected_sellers)
+            else:
+                selected_offer = legacy_get_best_offer(
+                    offers_database[card_name], amount_left, selected_sellers, sellers_db_cards_available
+                )
+            selected_offers[card_name].append(selected_offer)
+            amount_left -= int(selected_offer["selected_amount"])
+    return selected_offers
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        card_list_path = Path(tmp_dir) / "card_list.txt"
+        sellers_database_path = Path(tmp_dir) / "sellers_database.json"
+        offers_database_path = Path(tmp_dir) / "offers_database.json"
+        generate_data(
+            args.num_sellers,
+            1.0,
+            5.0,
+            0.02,
+            2.0,
+            1,
+            args.offer_max_amount,
+            args.num_cards,
+            args.card_min_offers,
+            args.card_max_offers,
+            1,
+            args.max_card_amount,
+            card_list_path,
+            sellers_database_path,
+            offers_database_path,
+        )
+        with offers_database_path.open("r", encoding="utf-8") as fp:
+            offers_database = json.load(fp)
+        card_list = {}
+        with card_list_path.open("r", encoding="utf-8") as fp:
+            for line in fp:
+                amount, card_name = line.strip().split(" ", maxsplit=1)
+                card_list[card_name] = int(amount)
+
+    sellers_db_cards_available: dict[str, dict[str, int | float]] = {}
+    for card_name, amount in card_list.items():
+        for offer in offers_database[card_name]:
+            seller_entry = sellers_db_cards_available.setdefault(str(offer["seller"]), {"cards_available": 0})
+            seller_entry["cards_available"] += min(int(offer["amount"]), amount)
+
+    results = {}
+    for name, use_queue in (("sort", False), ("queue", True)):
+        data = copy.deepcopy(offers_database)
+        start = time.perf_counter()
+        selected_offers = select_offers(card_list, data, sellers_db_cards_available, use_queue)
+        results[name] = (time.perf_counter() - start, selected_offers)
+
+    num_offers = sum(len(offers_database[card_name]) for card_name in card_list)
+    num_picks = sum(len(offers) for offers in results["sort"][1].values())
+    print(f"{len(card_list)} cards, {num_offers} offers, {num_picks} offers selected.")
+    for name, (elapsed, _) in results.items():
+        print(f"{name:>5}: {elapsed:.3f}s")
+    print(f"Speedup: {results['sort'][0] / results['queue'][0]:.1f}x")
+    identical = results["sort"][1] == results["queue"][1]
+    print(f"Identical results: {identical}")
+    if not identical:
+        raise SystemExit(1)
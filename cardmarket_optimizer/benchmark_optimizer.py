@@ -0,0 +1,293 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from gen_dummy_test_files import generate_data  # type:ignore[import-not-found]
+from optimizer import Optimizer, parse_card_list  # type:ignore[import-not-found]
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type:ignore[assignment]
+
+# Runs every strategy of the optimizer on a fixed grid of seeded instances generated by gen_dummy_test_files.py.
+# Records wall time, peak RSS, total price and number of sellers of each run, and compares them against a baseline
+# file. A run is a regression if it's more expensive than the baseline, or slower / uses more memory than the
+# baseline plus a tolerance. Every run is done in a fresh process so that the peak RSS of the runs is independent.
+#
+# Usage:
+#   python benchmark_optimizer.py --update-baseline   # Store the current results as the baseline.
+#   python benchmark_optimizer.py                     # Compare against the baseline, exit code 1 on regressions.
+# benchmark_baseline.json (next to this script) has the results of the small and medium instances. The total prices
+# and numbers of sellers are the same on any machine, but the wall times and peak RSS aren't: before comparing
+# performance, store a baseline of the unchanged code on your machine, e.g.:
+#   git stash && python benchmark_optimizer.py --instances small medium --update-baseline && git stash pop
+#   python benchmark_optimizer.py --instances small medium
+
+# Instance sizes. Same parameters as gen_dummy_test_files.py, plus the seed.
+INSTANCES: dict[str, dict[str, int | float]] = {
+    "small": {
+        "seed": 1,
+        "num_sellers": 200,
+        "num_cards": 30,
+        "card_min_offers": 20,
+        "card_max_offers": 100,
+        "offer_max_amount": 4,
+        "buy_list_max_card_amount": 4,
+    },
+    "medium": {
+        "seed": 2,
+        "num_sellers": 2000,
+        "num_cards": 200,
+        "card_min_offers": 100,
+        "card_max_offers": 500,
+        "offer_max_amount": 4,
+        "buy_list_max_card_amount": 4,
+    },
+    "large": {
+        "seed": 3,
+        "num_sellers": 5000,
+        "num_cards": 1000,
+        "card_min_offers": 1000,
+        "card_max_offers": 1000,
+        "offer_max_amount": 4,
+        "buy_list_max_card_amount": 4,
+    },
+}
+
+# The exact solver only runs on the instances where it finishes in a reasonable time.
+STRATEGIES: dict[str, list[str]] = {
+    "greedy": ["small", "medium", "large"],
+    "local_search": ["small", "medium", "large"],
+    "restarts": ["small", "medium", "large"],
+    "exact": ["small"],
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--baseline",
+        default=str(Path(__file__).parent / "benchmark_baseline.json"),
+        help="Path to the baseline file (default benchmark_baseline.json next to this script).",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Store the results as the new baseline instead of comparing against it.",
+    )
+    parser.add_argument("--csv", default=None, help="Path to an output CSV file with the results (default none).")
+    parser.add_argument(
+        "--instances",
+        nargs="+",
+        choices=list(INSTANCES),
+        default=list(INSTANCES),
+        help="Instances to run (default all).",
+    )
+    parser.add_argument(
+        "--strategies",
+        nargs="+",
+        choices=list(STRATEGIES),
+        default=list(STRATEGIES),
+        help="Strategies to run (default all).",
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=None,
+        help="Directory where the generated instances are kept, so they're only generated once (default temporary).",
+    )
+    parser.add_argument(
+        "--time-tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed relative increase of the wall time over the baseline (default 0.25).",
+    )
+    parser.add_argument(
+        "--memory-tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed relative increase of the peak RSS over the baseline (default 0.25).",
+    )
+    parser.add_argument(
+        "--local-search-time-limit",
+        type=float,
+        default=10.0,
+        help="Time limit in seconds for the local search (default 10).",
+    )
+    parser.add_argument("--restarts", type=int, default=8, help="Restarts of the 'restarts' strategy (default 8).")
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        default=60.0,
+        help="Time limit in seconds for the exact solver (default 60).",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def generate_instance(name: str, data_dir: Path) -> Path:
+    instance_dir = data_dir / name
+    if (instance_dir / "offers_database.json").exists():
+        return instance_dir
+    instance_dir.mkdir(parents=True, exist_ok=True)
+    params = INSTANCES[name]
+    random.seed(params["seed"])
+    generate_data(
+        int(params["num_sellers"]),
+        1.0,
+        5.0,
+        0.02,
+        2.0,
+        1,
+        int(params["offer_max_amount"]),
+        int(params["num_cards"]),
+        int(params["card_min_offers"]),
+        int(params["card_max_offers"]),
+        1,
+        int(params["buy_list_max_card_amount"]),
+        instance_dir / "card_list.txt",
+        instance_dir / "sellers_database.json",
+        instance_dir / "offers_database.json",
+    )
+    return instance_dir
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return round(peak_rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_strategy(instance_dir: Path, strategy: str, options: dict[str, float]) -> dict[str, float | int | None]:
+    """Load the instance and solve it with the strategy. Runs in its own process."""
+    optimizer = Optimizer.load(instance_dir / "offers_database.json", instance_dir / "sellers_database.json")
+    card_list = parse_card_list(instance_dir / "card_list.txt")
+    strategy_options = {
+        "greedy": {"local_search_time_limit": 0},
+        "local_search": {},
+        "restarts": {"restarts": options["restarts"]},
+        "exact": {"solver": "exact"},
+    }[strategy]
+
+    start = time.perf_counter()
+    result = optimizer.solve(
+        card_list,
+        {
+            "local_search_time_limit": options["local_search_time_limit"],
+            "time_limit": options["time_limit"],
+            "lower_bound_time_limit": 0,
+            **strategy_options,
+        },
+    )
+    wall_time = time.perf_counter() - start
+
+    return {
+        "wall_time": round(wall_time, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "total_price": result["total_price"],
+        "num_sellers": len(result["sellers"]),
+    }
+
+
+def find_regressions(
+    results: dict[str, dict[str, dict]],
+    baseline: dict[str, dict[str, dict]],
+    time_tolerance: float,
+    memory_tolerance: float,
+) -> list[str]:
+    regressions = []
+    for instance, instance_results in results.items():
+        for strategy, result in instance_results.items():
+            expected = baseline.get(instance, {}).get(strategy)
+            if expected is None:
+                continue
+            run = f"{instance}/{strategy}"
+            if result["total_price"] > expected["total_price"] + 0.005:
+                regressions.append(f"{run}: total price {result['total_price']} > {expected['total_price']}")
+            # Small absolute slack, so that timer noise on tiny instances isn't reported.
+            if result["wall_time"] > expected["wall_time"] * (1 + time_tolerance) + 0.05:
+                regressions.append(f"{run}: wall time {result['wall_time']}s > {expected['wall_time']}s")
+            if (
+                result["peak_rss_mb"] is not None
+                and expected["peak_rss_mb"] is not None
+                and result["peak_rss_mb"] > expected["peak_rss_mb"] * (1 + memory_tolerance)
+            ):
+                regressions.append(f"{run}: peak RSS {result['peak_rss_mb']}MB > {expected['peak_rss_mb']}MB")
+    return regressions
+
+
+def write_csv(results: dict[str, dict[str, dict]], path: str):
+    fields = ["instance", "strategy", "wall_time", "peak_rss_mb", "total_price", "num_sellers"]
+    with Path(path).open("w", encoding="utf-8", newline="") as fp:
+        writer = csv.DictWriter(fp, fieldnames=fields)
+        writer.writeheader()
+        for instance, instance_results in results.items():
+            for strategy, result in instance_results.items():
+                writer.writerow({"instance": instance, "strategy": strategy, **result})
+
+
+def run_benchmark(args, data_dir: Path) -> dict[str, dict[str, dict]]:
+    options = {
+        "local_search_time_limit": args.local_search_time_limit,
+        "restarts": args.restarts,
+        "time_limit": args.time_limit,
+    }
+    # A new process per run, started from scratch (spawn), so the peak RSS only counts that run.
+    context = multiprocessing.get_context("spawn")
+    results: dict[str, dict[str, dict]] = {}
+    for instance in args.instances:
+        instance_dir = generate_instance(instance, data_dir)
+        for strategy in args.strategies:
+            if instance not in STRATEGIES[strategy]:
+                continue
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_strategy, instance_dir, strategy, options).result()
+            results.setdefault(instance, {})[strategy] = result
+            print(
+                f"{instance:>6} {strategy:>12}: {result['wall_time']:>8.3f}s {result['peak_rss_mb']}MB "
+                f"total_price={result['total_price']} num_sellers={result['num_sellers']}"
+            )
+    return results
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.data_dir is not None:
+        results = run_benchmark(args, Path(args.data_dir))
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results = run_benchmark(args, Path(tmp_dir))
+
+    if args.csv is not None:
+        write_csv(results, args.csv)
+
+    baseline_path = Path(args.baseline)
+    baseline = {}
+    if baseline_path.exists():
+        with baseline_path.open("r", encoding="utf-8") as fp:
+            baseline = json.load(fp)
+    if args.update_baseline:
+        for instance, instance_results in results.items():
+            baseline.setdefault(instance, {}).update(instance_results)
+        with baseline_path.open("w", encoding="utf-8") as fp:
+            json.dump(baseline, fp, indent=2, sort_keys=True)
+        print(f"Baseline saved to {baseline_path}.")
+    elif not baseline:
+        print(f"No baseline found at {baseline_path}. Run with --update-baseline to create it.")
+    else:
+        regressions = find_regressions(results, baseline, args.time_tolerance, args.memory_tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            raise SystemExit(1)
+        print("No regressions.")
@@ -0,0 +1,106 @@
+import argparse
+import random
+import time
+from pathlib import Path
+
+from page_parser import parse_offer_rows  # type:ignore[import-not-found]
+
+# Measures how many offer rows per second parse_offer_rows reads from a card page.
+# Uses a saved card page (e.g. driver.page_source written to a file) if given, else a generated page
+# with the same structure as the offers table of Cardmarket.
+# Before, get_row_data needed 6 WebDriver calls per row (button, seller, condition, language, amount, price),
+# now a page needs 1 (driver.page_source) plus the parsing measured here.
+
+ROW_TEMPLATE = """
+<div id="articleRow{row_id}" class="row g-0 article-row">
+  <div class="col-sellerProductInfo col">
+    <div class="row g-0">
+      <div class="col-seller col-12 col-lg-auto">
+        <span class="seller-info d-flex align-items-center">
+          <span class="icon d-flex has-content-centered me-1" aria-label="Item location: Germany"></span>
+          <span class="d-flex has-content-centered me-1 seller-name">
+            <a href="/en/Magic/Users/{seller}">{seller}</a>
+          </span>
+        </span>
+      </div>
+      <div class="col-product col-12 col-lg">
+        <div class="product-attributes col">
+          <a href="/en/Magic/Help/CardCondition" class="article-condition condition-nm me-1"><span>NM</span></a>
+          <span class="icon me-2" aria-label="{language}"></span>
+        </div>
+        <div class="product-comments me-1 col"><span class="text-truncate">{comment}</span></div>
+      </div>
+    </div>
+  </div>
+  <div class="col-offer col-auto">
+    <div class="price-container d-none d-md-flex justify-content-end">
+      <div class="d-flex flex-column">
+        <div class="d-flex align-items-center justify-content-end">
+          <span class="color-primary small text-end text-nowrap fw-bold">{price} €</span>
+        </div>
+      </div>
+    </div>
+    <div class="amount-container d-none d-md-flex justify-content-end me-3">
+      <span class="item-count small text-end">{amount}</span>
+    </div>
+    <div class="actions-container col ps-2 ps-md-3">
+      <div class="input-group-wrapper">
+        <form method="post">
+          <input type="hidden" name="idArticle" value="{row_id}">
+          <button type="submit" class="btn btn-primary btn-sm" aria-label="Put in shopping cart"></button>
+        </form>
+      </div>
+    </div>
+  </div>
+</div>
+"""
+
+
+def generate_page(num_rows: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    rows = [
+        ROW_TEMPLATE.format(
+            row_id=1000000 + i,
+            seller=f"seller{rng.randint(1, 5000)}",
+            language=rng.choice(["English", "German", "Spanish"]),
+            comment=rng.choice(["", "Mint", "Fast shipping"]),
+            price=f"{rng.uniform(0.02, 20):.2f}".replace(".", ","),
+            amount=rng.randint(1, 4),
+        )
+        for i in range(num_rows)
+    ]
+    # Header, search filters and footer of the page, that the parser has to skip.
+    header = "".join(f'<div class="filter-{i}"><label>Filter {i}</label><input name="f{i}"></div>' for i in range(300))
+    return (
+        "<html><head><script>var x = '<div>';</script></head><body>" + header + '<section id="table">'
+        '<div class="table-body">' + "".join(rows) + "</div></section>" + header + "</body></html>"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixture", "-f", default=None, help="Path to a saved card page (default generated page).")
+    parser.add_argument("--rows", type=int, default=50, help="Rows of the generated page (default 50).")
+    parser.add_argument("--repeat", type=int, default=200, help="Times the page is parsed (default 200).")
+    args = parser.parse_args()
+
+    if args.fixture is not None:
+        html = Path(args.fixture).read_text(encoding="utf-8")
+    else:
+        html = generate_page(args.rows)
+
+    rows = parse_offer_rows(html)
+    if not rows:
+        raise SystemExit("No offer rows found in the page.")
+    print(f"First row: {rows[0]}")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        parse_offer_rows(html)
+    elapsed = time.perf_counter() - start
+    num_rows = len(rows) * args.repeat
+    print(f"{len(rows)} rows per page, {len(html)} bytes per page.")
+    print(
+        f"Parsed {num_rows} rows in {elapsed:.3f}s: {num_rows / elapsed:.0f} rows/s, {elapsed / args.repeat * 1000:.2f}ms/page."
+    )
+    print(f"WebDriver calls per page: {6 * len(rows)} before (find_element per field), 1 now (page_source).")
@@ -0,0 +1,83 @@
+import bisect
+import math
+
+
+class CardStats:
+    """
+    Statistics of the offers of one card: offer count, seller count, price quantiles and cheapest offer.
+    Prices are kept sorted (in cents) so that the statistics can be updated when an offer is removed,
+    without going through all the offers again.
+    """
+
+    def __init__(self, offers: list[dict[str, int | float | str]]):
+        self.offers = list(offers)
+        self.positions = {id(offer): i for i, offer in enumerate(self.offers)}
+        self.sorted_prices: list[tuple[int, int]] = sorted(
+            (round(float(offer["price"]) * 100), i) for i, offer in enumerate(self.offers)
+        )
+        self.sellers: dict[str, int] = {}
+        for offer in self.offers:
+            self.sellers[str(offer["seller"])] = self.sellers.get(str(offer["seller"]), 0) + 1
+        # Sum of the cheapest half of the prices.
+        self.cheapest_half_sum = sum(price for price, _ in self.sorted_prices[: self._half_size()])
+
+    def _half_size(self) -> int:
+        return math.ceil(len(self.sorted_prices) / 2)
+
+    @property
+    def num_offers(self) -> int:
+        return len(self.sorted_prices)
+
+    @property
+    def num_sellers(self) -> int:
+        return len(self.sellers)
+
+    @property
+    def cheapest_offer(self) -> dict[str, int | float | str] | None:
+        if not self.sorted_prices:
+            return None
+        return self.offers[self.sorted_prices[0][1]]
+
+    @property
+    def cheapest_half_average(self) -> float:
+        """Average price of the cheapest half of the offers."""
+        if not self.sorted_prices:
+            return 0.0
+        return round(self.cheapest_half_sum / self._half_size() / 100, 2)
+
+    def price_quantile(self, q: float) -> float:
+        """Price at quantile q (0 = cheapest, 1 = most expensive), using the nearest rank."""
+        if not self.sorted_prices:
+            return 0.0
+        index = min(len(self.sorted_prices) - 1, max(0, math.ceil(q * len(self.sorted_prices)) - 1))
+        return self.sorted_prices[index][0] / 100
+
+    def remove(self, offer: dict[str, int | float | str]):
+        """Update the statistics after the offer was removed from the card's offers."""
+        position = self.positions.pop(id(offer))
+        half_size = self._half_size()
+        index = bisect.bisect_left(self.sorted_prices, (round(float(offer["price"]) * 100), position))
+        price, _ = self.sorted_prices.pop(index)
+        if index < half_size:
+            # The next cheapest price moves into the cheapest half.
+            self.cheapest_half_sum -= price
+            if half_size - 1 < len(self.sorted_prices):
+                self.cheapest_half_sum += self.sorted_prices[half_size - 1][0]
+        if self._half_size() < half_size and half_size - 1 < len(self.sorted_prices):
+            self.cheapest_half_sum -= self.sorted_prices[half_size - 1][0]
+        seller = str(offer["seller"])
+        self.sellers[seller] -= 1
+        if self.sellers[seller] == 0:
+            del self.sellers[seller]
+
+
+def build_card_stats_index(
+    offers_database: dict[str, list[dict[str, int | float | str]]],
+    card_names=None,
+) -> dict[str, CardStats]:
+    """Build the statistics of every card in the offers database (or only of the given cards)."""
+    if card_names is None:
+        card_names = offers_database.keys()
+    return {
+        card_name: CardStats(offers_database[card_name]) for card_name in card_names if card_name in offers_database
+    }
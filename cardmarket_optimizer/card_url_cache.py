@@ -0,0 +1,37 @@
+import json
+import os
+import time
+from pathlib import Path
+
+# Cache of the editions of each card found with the search form of the Singles page (their edition, rarity and
+# product url), since they rarely change. A card in the cache goes straight to its product pages. Format:
+#   {"<card name>": {"cached_at": <time>, "editions": [["<edition>", "<rarity>", "<product url>"], ...]}, ...}
+# The entries older than the TTL are searched again.
+
+
+class CardUrlCache:
+    def __init__(self, path: str | Path, ttl: float):
+        """ttl: seconds an entry is valid."""
+        self.path = Path(path)
+        self.ttl = ttl
+        self.entries: dict[str, dict] = {}
+        if self.path.is_file():
+            with self.path.open("r", encoding="utf-8") as fp:
+                self.entries = json.load(fp)
+
+    def get(self, card_name: str) -> list[tuple[str, str, str]] | None:
+        """Editions of the card (edition, rarity, product url), or None if not cached or expired."""
+        entry = self.entries.get(card_name)
+        if entry is None or time.time() - entry["cached_at"] > self.ttl:
+            return None
+        return [tuple(edition) for edition in entry["editions"]]  # type:ignore[misc]
+
+    def set(self, card_name: str, editions: list[tuple[str, str, str]]):
+        self.entries[card_name] = {"cached_at": time.time(), "editions": [list(edition) for edition in editions]}
+
+    def save(self):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as fp:
+            json.dump(self.entries, fp, indent=2, sort_keys=True)
+        # Replaced at once, so a crash while saving leaves the old cache.
+        os.replace(tmp_path, self.path)
@@ -1,8 +1,13 @@
 import re
+import statistics
+import threading
+import time
 
+from selenium.common.exceptions import JavascriptException, StaleElementReferenceException, TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
+from telemetry import percentile  # type:ignore[import-not-found]
 
 
 def handle_alert(driver, timeout=5, verbose=False) -> bool | None:
@@ -75,3 +80,116 @@ def get_cart_price(driver) -> float:
     cart_text = cart_price_el.text.strip()
 
     return float(parse_number(cart_text))
+
+
+# Watches the cart badge (the total price in the header) with a MutationObserver installed in the page before the
+# action that changes the cart, so that the wait is a single call that returns as soon as the price changes.
+# window.cartWatch.changed is set when the badge's text is different from the one it had when it was installed.
+WATCH_CART_SCRIPT = """
+const cart = document.getElementById("cart");
+if (!cart) {
+    window.cartWatch = null;
+    return false;
+}
+if (window.cartWatch && window.cartWatch.observer) {
+    window.cartWatch.observer.disconnect();
+}
+const watch = {text: cart.textContent, changed: false, resolve: null};
+watch.observer = new MutationObserver(() => {
+    if (cart.textContent !== watch.text) {
+        watch.changed = true;
+        watch.observer.disconnect();
+        if (watch.resolve) {
+            watch.resolve(true);
+        }
+    }
+});
+watch.observer.observe(cart, {subtree: true, childList: true, characterData: true});
+window.cartWatch = watch;
+return true;
+"""
+
+# Resolves with true when the watched cart changes, false after the timeout, or null if no watch is installed
+# (e.g. the page was reloaded).
+WAIT_CART_SCRIPT = """
+const done = arguments[arguments.length - 1];
+const watch = window.cartWatch;
+if (!watch) {
+    done(null);
+} else if (watch.changed) {
+    done(true);
+} else {
+    watch.resolve = done;
+    setTimeout(() => done(false), arguments[0] * 1000);
+}
+"""
+
+
+class WaitMetrics:
+    """Durations of the waits (e.g. for the cart to change after adding an article) and how many timed out."""
+
+    def __init__(self):
+        self.times: list[float] = []
+        self.timeouts = 0
+        self.lock = threading.Lock()
+
+    def record(self, duration: float, timed_out: bool):
+        with self.lock:
+            self.times.append(duration)
+            self.timeouts += timed_out
+
+    def report(self) -> str:
+        if not self.times:
+            return "No waits."
+        times = sorted(self.times)
+        p95 = percentile(times, 0.95)
+        return (
+            f"{len(times)} waits ({self.timeouts} timed out): mean {statistics.mean(times):.2f}s, "
+            f"p50 {statistics.median(times):.2f}s, p95 {p95:.2f}s, max {times[-1]:.2f}s."
+        )
+
+
+cart_wait_metrics = WaitMetrics()
+
+
+def watch_cart(driver):
+    """Start watching the cart badge. Call it before the action that changes the cart, then wait_for_cart_change."""
+    try:
+        driver.execute_script(WATCH_CART_SCRIPT)
+    except JavascriptException:
+        pass
+
+
+def wait_for_cart_change(driver, cart_price_before: float, timeout: float = 10.0) -> float:
+    """
+    Wait until the cart price is different from cart_price_before, for at most timeout seconds.
+    Returns the new cart price (cart_price_before if it didn't change).
+    Uses the watch of watch_cart if it's still installed, else polls the cart price every 0.1s.
+    """
+    start = time.perf_counter()
+    try:
+        if timeout + 5 > driver.timeouts.script:
+            driver.set_script_timeout(timeout + 5)
+        changed = driver.execute_async_script(WAIT_CART_SCRIPT, timeout)
+    except (JavascriptException, TimeoutException):
+        changed = None
+    cart_price_after = cart_price_before
+    if changed is None:
+
+        def get_new_cart_price(driver) -> float | bool:
+            cart_price = get_cart_price(driver)
+            return cart_price if cart_price != cart_price_before else False
+
+        try:
+            cart_price_after = WebDriverWait(
+                driver,
+                max(0.0, timeout - (time.perf_counter() - start)),
+                poll_frequency=0.1,
+                ignored_exceptions=(StaleElementReferenceException, TimeoutException),
+            ).until(get_new_cart_price)
+        except TimeoutException:
+            pass
+    elif changed:
+        cart_price_after = get_cart_price(driver)
+    cart_wait_metrics.record(time.perf_counter() - start, cart_price_after == cart_price_before)
+    return cart_price_after
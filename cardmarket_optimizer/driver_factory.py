@@ -0,0 +1,100 @@
+import statistics
+import time
+from pathlib import Path
+
+from fixtures import save_fixture  # type:ignore[import-not-found]
+from selenium import webdriver
+from selenium.webdriver.firefox.options import Options
+from telemetry import percentile  # type:ignore[import-not-found]
+
+# Creates the Firefox used by the Selenium scripts. By default it's tuned to load pages fast ("lean"):
+# - No images, media or web fonts, and the trackers of Firefox's tracking protection are blocked.
+# - Hosts other than the allowed ones (e.g. analytics, ads) are blocked with a proxy auto-config (PAC) that sends
+#   them to a closed port.
+# - "eager" page load strategy: driver.get returns when the DOM is ready, without waiting for all the resources.
+# The driver records how long each driver.get takes, to compare runs (e.g. with and without --full-browser).
+# With a record_dir, it also saves every page it loads (see fixtures.py), to replay them later without the site.
+
+LEAN_PREFERENCES = {
+    "permissions.default.image": 2,
+    "media.autoplay.default": 5,
+    "media.autoplay.blocking_policy": 2,
+    "media.preload.default": 0,
+    "media.preload.auto": 0,
+    "gfx.downloadable_fonts.enabled": False,
+    "browser.display.use_document_fonts": 0,
+    "privacy.trackingprotection.enabled": True,
+    "privacy.trackingprotection.socialtracking.enabled": True,
+}
+
+
+class TimedFirefox(webdriver.Firefox):
+    """Firefox that records how long each page load (get) takes, and the loaded pages if record_dir is given."""
+
+    def __init__(self, *args, record_dir: str | Path | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.page_load_times: list[float] = []
+        self.record_dir = record_dir
+
+    def get(self, url: str):
+        start = time.perf_counter()
+        super().get(url)
+        self.page_load_times.append(time.perf_counter() - start)
+        self.record_page()
+
+    def record_page(self, variant: str = ""):
+        """
+        Save the current page, if recording. For the pages reached without get (e.g. submitting a form) and the
+        pages seen in several states (variant).
+        """
+        if self.record_dir is not None:
+            save_fixture(self.record_dir, self.current_url, self.page_source, variant)
+
+    def page_load_report(self) -> str:
+        if not self.page_load_times:
+            return "No pages loaded."
+        times = sorted(self.page_load_times)
+        p95 = percentile(times, 0.95)
+        return (
+            f"{len(times)} page loads: total {sum(times):.1f}s, mean {statistics.mean(times):.2f}s, "
+            f"p50 {statistics.median(times):.2f}s, p95 {p95:.2f}s."
+        )
+
+
+def get_proxy_auto_config(allowed_hosts: list[str]) -> str:
+    """PAC that lets the allowed hosts (and their subdomains) through and sends the rest to a closed port."""
+    conditions = " || ".join(f'host == "{host}" || dnsDomainIs(host, ".{host}")' for host in allowed_hosts)
+    return (
+        "data:text/javascript,function FindProxyForURL(url, host) {"
+        f' if ({conditions}) return "DIRECT"; return "PROXY 127.0.0.1:9"; '
+        "}"
+    )
+
+
+def create_driver(
+    browser_profile: str | None = None,
+    headless: bool = False,
+    lean: bool = True,
+    allowed_hosts: list[str] | None = None,
+    record_dir: str | Path | None = None,
+) -> TimedFirefox:
+    """
+    browser_profile: Firefox profile to use (e.g. with the site's cookies), else a new temporary profile.
+    lean: Block images, media, fonts and trackers, and use the "eager" page load strategy.
+    allowed_hosts: With lean, the hosts that can be loaded (with their subdomains). If None, no host is blocked.
+    record_dir: Directory where the loaded pages are saved (see fixtures.py). If None, they aren't saved.
+    """
+    options = Options()
+    if browser_profile:
+        options.add_argument("-profile")
+        options.add_argument(browser_profile)
+    if headless:
+        options.add_argument("-headless")
+    if lean:
+        for name, value in LEAN_PREFERENCES.items():
+            options.set_preference(name, value)
+        if allowed_hosts is not None:
+            options.set_preference("network.proxy.type", 2)
+            options.set_preference("network.proxy.autoconfig_url", get_proxy_auto_config(allowed_hosts))
+        options.page_load_strategy = "eager"
+    return TimedFirefox(options=options, record_dir=record_dir)
@@ -0,0 +1,214 @@
+import numpy as np
+from greedy import calc_total_prices  # type:ignore[import-not-found]
+from scipy.optimize import Bounds, LinearConstraint, milp
+from scipy.sparse import coo_array
+from shipping import get_shipping_tables  # type:ignore[import-not-found]
+
+# MODEL: Seller fixed-charge problem, solved as a MILP.
+#        Variables: x[o] = copies bought from offer o (0 <= x[o] <= amount of the offer).
+#                   y[s] = 1 if we buy anything from seller s (so we pay its shipping), else 0.
+#        Minimize:  sum(price[o] * x[o]) + sum(shipping[s] * y[s])
+#        Subject to:
+#          For each card c:              sum(x[o] for o in offers of c) == amount needed of c
+#          For each card c and seller s: sum(x[o] for o in offers of c from s) <= copies of c that s sells * y[s]
+#        The second constraint is aggregated per card and seller (instead of one per offer),
+#        which makes the LP relaxation tighter and the model smaller.
+#        Sellers with tiered shipping (see shipping.py) pay the price of a chosen tier instead of shipping[s]:
+#                   z[s, t] = 1 if seller s ships with tier t. sum(z[s, t] for t) == y[s].
+#          For each tier t with limits (all but the most expensive one, which is used when no tier allows the order):
+#            articles[s] <= max_articles[t] * z[s, t] + max articles of s * (1 - z[s, t])
+#            value[s]    <= max_value[t] * z[s, t] + max value of s * (1 - z[s, t])
+#        Minimizing picks the cheapest tier that allows the order, the price ShippingTable.price gives.
+
+
+def cheapest_fill(
+    offers: list[dict[str, int | float | str]], amount: int, sellers: set[str]
+) -> list[tuple[dict[str, int | float | str], int]] | None:
+    """Buy the cheapest copies of a card from the given sellers. Returns None if there are not enough copies."""
+    selection = []
+    amount_left = amount
+    for offer in sorted(offers, key=lambda x: float(x["price"])):
+        if amount_left <= 0:
+            break
+        if offer["seller"] not in sellers:
+            continue
+        selected_amount = min(int(offer["amount"]), amount_left)
+        selection.append((offer, selected_amount))
+        amount_left -= selected_amount
+    if amount_left > 0:
+        return None
+    return selection
+
+
+def solve_exact(
+    card_list: dict[str, int],
+    offers_database: dict[str, list[dict[str, int | float | str]]],
+    sellers_database: dict[str, float | list[dict[str, int | float]]],
+    time_limit: float = 60.0,
+    incumbent_sellers: set[str] | None = None,
+    verbose: bool = False,
+) -> tuple[dict[str, list[dict[str, int | float | str]]], bool]:
+    """
+    Find the cheapest selection of offers (items + shipping) for the card list.
+    If incumbent_sellers is given (e.g. the sellers selected by the greedy algorithm), its solution is returned
+    when the solver can't find a better one within the time limit.
+    Returns the selected offers, in the same format as run_algo, and whether the solution is proven to be optimal.
+    """
+    card_names = [card_name for card_name in card_list if card_name in offers_database]
+    shipping_tables = get_shipping_tables(sellers_database, offers_database, card_names)
+    seller_index = {seller: i for i, seller in enumerate(shipping_tables)}
+    num_sellers = len(seller_index)
+
+    offers: list[tuple[str, dict[str, int | float | str]]] = [
+        (card_name, offer) for card_name in card_names for offer in offers_database[card_name]
+    ]
+    num_offers = len(offers)
+    # Can't buy more copies than the ones available.
+    cards_amount = {
+        card_name: min(card_list[card_name], sum(int(offer["amount"]) for offer in offers_database[card_name]))
+        for card_name in card_names
+    }
+    card_index = {card_name: i for i, card_name in enumerate(card_names)}
+    card_seller_index: dict[tuple[str, str], int] = {}
+    card_seller_amounts: list[int] = []
+
+    # Demand constraints (one row per card) and linking constraints (one row per card and seller).
+    demand_rows, demand_cols = [], []
+    link_rows, link_cols, link_vals = [], [], []
+    for i, (card_name, offer) in enumerate(offers):
+        demand_rows.append(card_index[card_name])
+        demand_cols.append(i)
+        key = (card_name, str(offer["seller"]))
+        if key not in card_seller_index:
+            card_seller_index[key] = len(card_seller_index)
+            card_seller_amounts.append(0)
+        row = card_seller_index[key]
+        card_seller_amounts[row] += int(offer["amount"])
+        link_rows.append(row)
+        link_cols.append(i)
+        link_vals.append(1.0)
+    for (card_name, seller), row in card_seller_index.items():
+        link_rows.append(row)
+        link_cols.append(num_offers + seller_index[seller])
+        link_vals.append(-float(min(card_seller_amounts[row], cards_amount[card_name])))
+
+    # Shipping of the sellers: a flat price goes in the cost of y[s], tiers get one variable each (after the y[s]).
+    seller_costs = [0.0 if table.tiered else table.base_price for table in shipping_tables.values()]
+    tier_costs: list[float] = []
+    tier_rows, tier_cols, tier_vals = [], [], []
+    limit_rows, limit_cols, limit_vals, limit_upper = [], [], [], []
+    num_tier_rows = 0
+    seller_offers: dict[str, list[int]] = {}
+    for i, (card_name, offer) in enumerate(offers):
+        seller_offers.setdefault(str(offer["seller"]), []).append(i)
+    for seller, table in shipping_tables.items():
+        if not table.tiered:
+            continue
+        # Most articles and value the seller can sell for the card list.
+        max_articles = sum(
+            min(card_seller_amounts[row], cards_amount[card_name])
+            for (card_name, row_seller), row in card_seller_index.items()
+            if row_seller == seller
+        )
+        max_value = sum(
+            float(offers[i][1]["price"]) * min(int(offers[i][1]["amount"]), cards_amount[offers[i][0]])
+            for i in seller_offers[seller]
+        )
+        row = num_tier_rows
+        num_tier_rows += 1
+        tier_rows.append(row)
+        tier_cols.append(num_offers + seller_index[seller])
+        tier_vals.append(-1.0)
+        for tier_idx, (price, tier_max_articles, tier_max_value) in enumerate(table.tiers):
+            col = num_offers + num_sellers + len(tier_costs)
+            tier_costs.append(price)
+            tier_rows.append(row)
+            tier_cols.append(col)
+            tier_vals.append(1.0)
+            if tier_idx == len(table.tiers) - 1:
+                # The most expensive tier is used when no other one allows the order.
+                continue
+            if tier_max_articles < max_articles:
+                limit_row = len(limit_upper)
+                limit_rows.extend([limit_row] * (len(seller_offers[seller]) + 1))
+                limit_cols.extend(seller_offers[seller] + [col])
+                limit_vals.extend([1.0] * len(seller_offers[seller]) + [float(max_articles - tier_max_articles)])
+                limit_upper.append(float(max_articles))
+            if tier_max_value < max_value:
+                limit_row = len(limit_upper)
+                limit_rows.extend([limit_row] * (len(seller_offers[seller]) + 1))
+                limit_cols.extend(seller_offers[seller] + [col])
+                limit_vals.extend([float(offers[i][1]["price"]) for i in seller_offers[seller]])
+                limit_vals.append(max_value - tier_max_value)
+                limit_upper.append(max_value)
+    num_tiers = len(tier_costs)
+    num_vars = num_offers + num_sellers + num_tiers
+
+    demand_matrix = coo_array((np.ones(num_offers), (demand_rows, demand_cols)), shape=(len(card_names), num_vars))
+    demand = np.array([cards_amount[card_name] for card_name in card_names], dtype=float)
+    link_matrix = coo_array((link_vals, (link_rows, link_cols)), shape=(len(card_seller_index), num_vars))
+    constraints = [
+        LinearConstraint(demand_matrix.tocsr(), demand, demand),
+        LinearConstraint(link_matrix.tocsr(), -np.inf, 0.0),
+    ]
+    if num_tiers:
+        tier_matrix = coo_array((tier_vals, (tier_rows, tier_cols)), shape=(num_tier_rows, num_vars))
+        constraints.append(LinearConstraint(tier_matrix.tocsr(), 0.0, 0.0))
+    if limit_upper:
+        limit_matrix = coo_array((limit_vals, (limit_rows, limit_cols)), shape=(len(limit_upper), num_vars))
+        constraints.append(LinearConstraint(limit_matrix.tocsr(), -np.inf, np.array(limit_upper)))
+
+    cost = np.concatenate(
+        (
+            np.array([float(offer["price"]) for _, offer in offers]),
+            np.array(seller_costs),
+            np.array(tier_costs),
+        )
+    )
+    upper_bounds = np.concatenate(
+        (np.array([float(offer["amount"]) for _, offer in offers]), np.ones(num_sellers + num_tiers))
+    )
+
+    result = milp(
+        cost,
+        integrality=np.ones(num_vars),
+        bounds=Bounds(np.zeros(num_vars), upper_bounds),
+        constraints=constraints,
+        options={"time_limit": time_limit, "disp": verbose},
+    )
+    optimal = result.status == 0
+
+    best_price = float("inf")
+    selected_offers: dict[str, list[dict[str, int | float | str]]] = {}
+    if result.x is not None:
+        for i, (card_name, offer) in enumerate(offers):
+            selected_amount = int(round(result.x[i]))
+            if selected_amount > 0:
+                selected_offer = dict(offer)
+                selected_offer["selected_amount"] = selected_amount
+                selected_offers.setdefault(card_name, []).append(selected_offer)
+        best_price = calc_total_prices(selected_offers, shipping_tables)[0]
+    if verbose:
+        print(f"Exact solver: {result.message}")
+
+    if incumbent_sellers and not optimal:
+        # Fall back to the best purchase from the given sellers if the solver didn't beat it.
+        incumbent_offers: dict[str, list[dict[str, int | float | str]]] = {}
+        incumbent_price = 0.0
+        for card_name in card_names:
+            selection = cheapest_fill(offers_database[card_name], cards_amount[card_name], incumbent_sellers)
+            if selection is None:
+                incumbent_price = float("inf")
+                break
+            for offer, selected_amount in selection:
+                selected_offer = dict(offer)
+                selected_offer["selected_amount"] = selected_amount
+                incumbent_offers.setdefault(card_name, []).append(selected_offer)
+        if incumbent_price == 0.0:
+            incumbent_price = calc_total_prices(incumbent_offers, shipping_tables)[0]
+        if incumbent_price < best_price:
+            if verbose:
+                print("Exact solver: Couldn't improve the starting solution.")
+            selected_offers = incumbent_offers
+
+    return selected_offers, optimal
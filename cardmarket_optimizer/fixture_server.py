@@ -0,0 +1,247 @@
+import argparse
+import html as html_lib
+import itertools
+import re
+import threading
+import uuid
+from http.cookies import CookieError, SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from common import parse_number  # type:ignore[import-not-found]
+from fixtures import fixture_key, load_fixture  # type:ignore[import-not-found]
+from page_parser import (  # type:ignore[import-not-found]
+    Element,
+    parse_html,
+    parse_offer_rows,
+    parse_result_card,
+    parse_shipment_blocks,
+)
+
+# Local stand-in for the sites: serves the pages recorded with --record-dir (see fixtures.py), so that the scripts can
+# run without a live login (e.g. to measure the parsing or to test a speed-up) by pointing them at it with --base-url:
+#   python scraper.py --record-dir fixtures/cardmarket ...        (records the pages of a run on the site)
+#   python fixture_server.py fixtures/cardmarket --port 8000
+#   python scraper.py --base-url http://127.0.0.1:8000 ...         (runs against the recorded pages)
+# The pages are served without their scripts (the site's JavaScript isn't replayed), so the forms are posted to this
+# server, which emulates the actions the scripts take on Cardmarket:
+# - Login: posting a form with a username logs the browser in. The pages recorded both logged out and logged in are
+#   served in their "logged-in" variant from then on.
+# - Add to cart: posting the form of an offer row (articleRow...) or of a Shopping Wizard seller (.detailed-result-card)
+#   puts its articles in the cart, with the seller's shipping price (from the recorded cart pages or the seller's wizard
+#   summary, else --shipping). The cart total in the header (#cart) is the total of this cart.
+# - Alerts: the page shown after a post has a success alert, or an error alert if the articles aren't in the recorded
+#   page. Its close button removes it.
+# - Empty cart: "Remove all articles" empties the cart. The empty cart page is the "empty-cart" variant.
+# Everything else is as recorded (e.g. the sellers listed in the cart page). The steps that need the site's JavaScript
+# (the Shopping Wizard's options, CardTrader's wishlist import and optimizer) can't be replayed, but their recorded
+# pages are served, e.g. to run the parsers on them.
+
+STRIPPED_PATTERN = re.compile(r"<script\b.*?</script\s*>|<!--.*?-->", re.DOTALL | re.IGNORECASE)
+FORM_PATTERN = re.compile(r"<form\b[^>]*>", re.IGNORECASE)
+BODY_PATTERN = re.compile(r"<body\b[^>]*>", re.IGNORECASE)
+CART_TOTAL_PATTERN = re.compile(r'(<a\b[^>]*\bid="cart"(?:(?!</a>).)*?<span\b[^>]*>)[^<]*€[^<]*(</span>)', re.DOTALL)
+DISMISS_SCRIPT = (
+    "<script>document.addEventListener('click', (event) => {"
+    " const button = event.target.closest(\"[data-bs-dismiss='alert']\");"
+    " if (button) button.closest('.alert').remove(); });</script>"
+)
+ALERT_TEMPLATE = (
+    '<div class="alert alert-{kind} alert-dismissible" role="alert">{message}'
+    '<button type="button" class="btn-close" data-bs-dismiss="alert" aria-label="Close">×</button></div>'
+)
+CLIENT_COOKIE = "fixture_client"
+
+
+def strip_scripts(html: str) -> str:
+    return STRIPPED_PATTERN.sub("", html)
+
+
+def prepare_page(html: str, page_key: str, cart_total: float, alert: tuple[str, str] | None) -> str:
+    """
+    The recorded page without its scripts, with the cart total and the alert. Every form gets the page and its index
+    in the page as hidden inputs, so that a post is matched with the recorded form whatever its action.
+    """
+    html = strip_scripts(html)
+    form_index = itertools.count()
+    page_input = f'<input type="hidden" name="_fixture_page" value="{html_lib.escape(page_key)}">'
+    html = FORM_PATTERN.sub(
+        lambda m: f'{m.group(0)}{page_input}<input type="hidden" name="_fixture_form" value="{next(form_index)}">', html
+    )
+    cart_text = f"{cart_total:.2f}".replace(".", ",") + " €"
+    html = CART_TOTAL_PATTERN.sub(lambda m: m.group(1) + cart_text + m.group(2), html, count=1)
+    injected = DISMISS_SCRIPT
+    if alert is not None:
+        injected += ALERT_TEMPLATE.format(kind=alert[0], message=html_lib.escape(alert[1]))
+    body = BODY_PATTERN.search(html)
+    position = body.end() if body is not None else 0
+    return html[:position] + injected + html[position:]
+
+
+def get_result_card_articles(result_card: Element) -> tuple[str, list[float], float | None]:
+    """Seller, article prices (one per copy) and shipping cost of a Shopping Wizard seller (.detailed-result-card)."""
+    result = parse_result_card(result_card)
+    prices = []
+    for article in result["articles"]:
+        prices.extend([float(parse_number(article["price"]))] * max(1, int(parse_number(article["quantity"]))))
+    shipping = None
+    for dt, dd in result["summary"]:
+        if dt.lower().replace(" ", "-") == "shipping-cost":
+            shipping = float(parse_number(dd))
+    return result["seller"], prices, shipping
+
+
+class ReplayState:
+    """The cart (shared by all the browsers, like the cart of an account) and the login and alert of each browser."""
+
+    def __init__(self, directory: str | Path, default_shipping: float):
+        self.directory = Path(directory)
+        self.default_shipping = default_shipping
+        self.lock = threading.Lock()
+        # Seller and price of every article in the cart.
+        self.cart: list[tuple[str, float]] = []
+        self.shipping: dict[str, float] = {}
+        for path in self.directory.glob("*ShoppingCart*.html"):
+            for block in parse_shipment_blocks(path.read_text(encoding="utf-8")):
+                if "shipping-price" in block:
+                    self.shipping.setdefault(block["seller"], float(block["shipping-price"]))
+        self.logged_in: set[str] = set()
+        self.alerts: dict[str, tuple[str, str]] = {}
+
+    def cart_total(self) -> float:
+        sellers = {seller for seller, _ in self.cart}
+        return sum(price for _, price in self.cart) + sum(
+            self.shipping.get(seller, self.default_shipping) for seller in sellers
+        )
+
+    def load_page(self, client: str, page_key: str) -> str | None:
+        """The recorded page in the variant for the state of the browser and the cart, else as first recorded."""
+        variants = []
+        if not self.cart and urlsplit(page_key).path.endswith("/ShoppingCart"):
+            variants.append("empty-cart")
+        if client in self.logged_in:
+            variants.append("logged-in")
+        variants.append("")
+        for variant in variants:
+            html = load_fixture(self.directory, page_key, variant)
+            if html is not None:
+                return html
+        return None
+
+    def post_form(self, client: str, form: dict[str, str]) -> tuple[str, str] | None:
+        """Does what the posted form does on the site. Returns the alert (kind, message) to show, if any."""
+        if "username" in form:
+            self.logged_in.add(client)
+            return None
+        html = self.load_page(client, form.get("_fixture_page", ""))
+        forms = list(parse_html(strip_scripts(html)).iter("form")) if html is not None else []
+        index = int(form.get("_fixture_form", -1))
+        if html is None or not 0 <= index < len(forms):
+            return ("danger", "The page or form wasn't recorded.")
+        element: Element | None = forms[index]
+        if any(x.get("value") == "Remove all articles" for x in forms[index].iter("input")):
+            self.cart.clear()
+            return ("success", "All articles were removed from your shopping cart.")
+        while element is not None:
+            if "articleRow" in element.get("id"):
+                row = next((x for x in parse_offer_rows(html) if x["id"] == element.get("id")), None)
+                if row is None or not row["price"]:
+                    return ("danger", "The article couldn't be put in your shopping cart.")
+                self.cart.append((str(row["seller"]), float(parse_number(str(row["price"])))))
+                return ("success", "The article was put in your shopping cart.")
+            if "detailed-result-card" in element.get("class").split():
+                seller, prices, shipping = get_result_card_articles(element)
+                if not seller or not prices:
+                    return ("danger", "The articles couldn't be put in your shopping cart.")
+                if shipping is not None:
+                    self.shipping.setdefault(seller, shipping)
+                self.cart.extend((seller, price) for price in prices)
+                return ("success", f"{len(prices)} articles were put in your shopping cart.")
+            element = element.parent
+        return ("success", "Done.")
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    # Keep-alive, every response has a Content-Length.
+    protocol_version = "HTTP/1.1"
+    server: "FixtureServer"
+
+    def get_client(self) -> tuple[str, bool]:
+        """Id of the browser (from its cookie) and whether it's new."""
+        try:
+            cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        except CookieError:
+            cookie = SimpleCookie()
+        if CLIENT_COOKIE in cookie:
+            return cookie[CLIENT_COOKIE].value, False
+        return uuid.uuid4().hex, True
+
+    def send(self, status: int, body: bytes, client: str, new_client: bool, headers: dict[str, str] | None = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        if new_client:
+            self.send_header("Set-Cookie", f"{CLIENT_COOKIE}={client}; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        state = self.server.state
+        client, new_client = self.get_client()
+        with state.lock:
+            html = state.load_page(client, self.path)
+            alert = state.alerts.pop(client, None) if html is not None else None
+            cart_total = state.cart_total()
+        if html is None:
+            html = f"<html><body>Page not recorded: {html_lib.escape(self.path)}</body></html>"
+            status = 404
+        else:
+            html = prepare_page(html, fixture_key(self.path), cart_total, alert)
+            status = 200
+        self.send(status, html.encode("utf-8"), client, new_client, {"Content-Type": "text/html; charset=utf-8"})
+
+    def do_POST(self):
+        state = self.server.state
+        client, new_client = self.get_client()
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        form = {name: values[0] for name, values in parse_qs(body, keep_blank_values=True).items()}
+        with state.lock:
+            alert = state.post_form(client, form)
+            if alert is not None:
+                state.alerts[client] = alert
+        # Back to the page of the form (post/redirect/get), which shows the alert.
+        self.send(303, b"", client, new_client, {"Location": form.get("_fixture_page", self.path)})
+
+
+class FixtureServer(ThreadingHTTPServer):
+    def __init__(self, address: tuple[str, int], state: ReplayState):
+        super().__init__(address, FixtureHandler)
+        self.state = state
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the pages recorded with --record-dir to replay the scripts.")
+    parser.add_argument("directory", help="Directory of the recorded pages (the --record-dir of the scripts).")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default 8000).")
+    parser.add_argument(
+        "--shipping",
+        type=float,
+        default=1.0,
+        help="Shipping price of the sellers that aren't in the recorded cart pages (default 1.0).",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = FixtureServer((args.host, args.port), ReplayState(args.directory, args.shipping))
+    print(f"Replaying {args.directory} at http://{args.host}:{args.port} (use it as --base-url).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
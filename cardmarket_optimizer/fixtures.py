@@ -0,0 +1,47 @@
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# Pages recorded from the sites (create_driver(record_dir=...), the --record-dir option of the scripts), to parse them
+# offline (e.g. benchmarks) or to replay them with fixture_server.py (the --base-url option of the scripts).
+# One file per page: its url's path and query (without the host, so that the same page is found on any base url) and
+# a variant for the pages that are seen in several states (e.g. "logged-in", "empty-cart"):
+#   <directory>/<path and query with the symbols replaced by _>[~<variant>]-<hash of the path, query and variant>.html
+# The page is saved as the browser has it (driver.page_source), after the scripts ran, with its url in a comment at
+# the top.
+
+
+def fixture_key(url: str) -> str:
+    """Path and query of the url, e.g. /en/Magic/Products/Search?searchString=Opt."""
+    parts = urlsplit(url)
+    return (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+
+def fixture_path(directory: str | Path, url: str, variant: str = "") -> Path:
+    key = fixture_key(url)
+    name = re.sub(r"[^A-Za-z0-9.-]+", "_", key).strip("_")[:100]
+    if variant:
+        name += f"~{variant}"
+    digest = hashlib.sha1(f"{key}~{variant}".encode("utf-8")).hexdigest()[:10]
+    return Path(directory) / f"{name}-{digest}.html"
+
+
+def save_fixture(directory: str | Path, url: str, html: str, variant: str = "") -> Path:
+    path = fixture_path(directory, url, variant)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written to a temporary file and replaced at once, since several browsers may record the same page.
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as fp:
+        fp.write(f"<!-- fixture: {url} -->\n{html}")
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_fixture(directory: str | Path, url: str, variant: str = "") -> str | None:
+    path = fixture_path(directory, url, variant)
+    if not path.is_file():
+        return None
+    return path.read_text(encoding="utf-8")
@@ -84,7 +84,7 @@ if __name__ == "__main__":
     parser.add_argument("--card-max-offers", type=int, required=True)
     parser.add_argument("--buy-list-min-card-amount", type=int, required=True)
     parser.add_argument("--buy-list-max-card-amount", type=int, required=True)
-    parser.add_argument("--buy-list-max-card-amount", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=None, help="Random seed (default random).")
     parser.add_argument(
         "--card-list",
         "-c",
@@ -106,6 +106,7 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
+    random.seed(args.seed)
     generate_data(
         args.num_sellers,
         args.seller_min_shipping_price,
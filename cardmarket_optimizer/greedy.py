@@ -0,0 +1,130 @@
+import random
+
+from card_stats import CardStats  # type:ignore[import-not-found]
+from offer_queue import OfferQueue  # type:ignore[import-not-found]
+from offer_store import OfferSnapshot, OfferStore  # type:ignore[import-not-found]
+from shipping import ShippingTable, ShippingTracker  # type:ignore[import-not-found]
+
+
+def calc_sellers_cards_available(
+    card_list: dict[str, int],
+    offers_database: OfferStore,
+    sellers_database: dict[str, float | list[dict[str, int | float]]],
+) -> dict[str, dict[str, int | float]]:
+    """Shipping price (the cheapest one, for tiered shipping) and amount of wanted cards available of each seller."""
+    sellers_cards_available: dict[str, dict[str, int | float]] = {
+        seller: {"shipping_price": ShippingTable(entry).base_price, "cards_available": 0}
+        for seller, entry in sellers_database.items()
+    }
+    for card_name, amount in card_list.items():
+        if card_name not in offers_database:
+            continue
+        for offer in offers_database[card_name]:
+            selected_amount = int(offer["amount"]) if amount >= int(offer["amount"]) else amount
+            if offer["seller"] not in sellers_cards_available:
+                sellers_cards_available[str(offer["seller"])] = {
+                    "shipping_price": float(offer["shipping_price"]),
+                    "cards_available": 0,
+                }
+            sellers_cards_available[str(offer["seller"])]["cards_available"] += selected_amount
+    return sellers_cards_available
+
+
+def calc_total_prices(
+    selected_offers: dict[str, list[dict[str, int | float | str]]],
+    shipping_tables: dict[str, ShippingTable] | None = None,
+):
+    if shipping_tables is not None:
+        # The shipping price of each seller depends on all the articles bought from it.
+        shipping = ShippingTracker(shipping_tables)
+        items_price = 0.0
+        for offers in selected_offers.values():
+            for offer in offers:
+                offer_items_price = float(offer["price"]) * int(offer["selected_amount"])
+                shipping.add(str(offer["seller"]), int(offer["selected_amount"]), offer_items_price)
+                items_price += offer_items_price
+        shipping_price = shipping.total
+        total_price = items_price + shipping_price
+        return round(total_price, 2), round(items_price, 2), round(shipping_price, 2), set(shipping.prices)
+
+    total_price = 0.0
+    items_price = 0.0
+    shipping_price = 0.0
+    seen_sellers = set()
+
+    for offers in selected_offers.values():
+        for offer in offers:
+            offer_items_price = float(offer["price"]) * int(offer["selected_amount"])
+            if offer["seller"] not in seen_sellers:
+                offer_shipping_price = float(offer["shipping_price"])
+                seen_sellers.add(offer["seller"])
+            else:
+                offer_shipping_price = 0.0
+            offer_total_price = offer_items_price + offer_shipping_price
+            total_price += offer_total_price
+            items_price += offer_items_price
+            shipping_price += offer_shipping_price
+
+    return round(total_price, 2), round(items_price, 2), round(shipping_price, 2), seen_sellers
+
+
+# ALGORITHM: Before running the algorithm, sort the cards by amount and then by price.
+#            Selects as many as possible for each offer. Then calculates the total price for each offer.
+#            Then calculates the per-card price for each offer. Then orders the offers by per-card price.
+#            Then selects the cheapest one, and if tied the one with the seller with most cards.
+#            Then calculates the remaining needed amount. Then does the whole process again until we buy all needed cards.
+#            Takes into account that if the card is from a seller that was selected previously,
+#            the shipping should be effectively free for this card, since the shipping was already considered previously.
+#            If a random generator is given, the card order is perturbed and offer ties are broken randomly,
+#            so that different runs explore different solutions.
+#            If a shipping tracker is given, the shipping of an offer is how much it increases the seller's
+#            shipping price (tiered shipping), instead of the full price for new sellers and free for selected ones.
+
+
+def run_algo(
+    card_list: dict[str, int],
+    offers_snapshot: OfferSnapshot,
+    card_stats: dict[str, CardStats],
+    sellers_cards_available: dict[str, dict[str, int | float]],
+    selected_offers: dict[str, list[dict[str, int | float | str]]] | None = None,
+    selected_sellers: set[str] | None = None,
+    rng: random.Random | None = None,
+    perturbation: float = 0.25,
+    shipping: ShippingTracker | None = None,
+) -> tuple[dict[str, list[dict[str, int | float | str]]], set[str]]:
+    def noise() -> float:
+        return rng.uniform(1 - perturbation, 1 + perturbation) if rng is not None else 1.0
+
+    # Sort by least offers, then most amount of cards in card list and then by most expensive.
+    # Helps prioritizing selecting sellers with more copies of a card and cheaper sellers for expensive cards.
+    card_list = dict(
+        sorted(
+            ((card_name, amount) for card_name, amount in card_list.items() if card_name in card_stats),
+            key=lambda x: (
+                card_stats[x[0]].num_offers * noise(),  # Least offers
+                -x[1],  # Most needed
+                -card_stats[x[0]].cheapest_half_average * noise(),  # Most expensive
+            ),
+        )
+    )
+
+    if selected_offers is None:
+        selected_offers = {}
+    if selected_sellers is None:
+        selected_sellers = set()
+    for card_name, amount in card_list.items():
+        if card_name not in offers_snapshot:
+            continue
+        # Don't drop the offers already selected for this card (e.g. when re-assigning items in a second pass).
+        selected_offers.setdefault(card_name, [])
+        amount_left = amount
+        # The selected offers are removed from the snapshot, so that they aren't selected again in a later pass.
+        offer_queue = OfferQueue(offers_snapshot[card_name], sellers_cards_available, rng, shipping)
+        while amount_left > 0:
+            offer, selected_offer = offer_queue.pop(amount_left, selected_sellers)
+            selected_offers[card_name].append(selected_offer)
+            offers_snapshot.remove(card_name, offer)
+            card_stats[card_name].remove(offer)
+            amount_left -= int(selected_offer["selected_amount"])
+
+    return selected_offers, selected_sellers
@@ -0,0 +1,46 @@
+import requests
+from requests.adapters import HTTPAdapter
+from selenium.webdriver.remote.webdriver import WebDriver
+
+# Fetches pages over plain HTTP with the session of a logged in browser (its cookies and user agent), reusing the
+# connections (keep-alive), instead of rendering them in the browser. For pages that are only read, e.g. the offers
+# table of a card page (parsed with page_parser.parse_offer_rows). Actions that need JavaScript (e.g. putting an
+# article in the cart) still need the browser.
+
+
+class HttpFetcher:
+    def __init__(self, driver: WebDriver, pool_size: int = 4, timeout: float = 20.0):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["User-Agent"] = str(driver.execute_script("return navigator.userAgent;"))
+        self.update_cookies(driver)
+
+    def update_cookies(self, driver: WebDriver):
+        """Copy the browser's cookies (e.g. again after the browser was used, in case the session cookie changed)."""
+        for cookie in driver.get_cookies():
+            self.session.cookies.set(
+                cookie["name"], cookie["value"], domain=cookie.get("domain", ""), path=cookie.get("path", "/")
+            )
+
+    def get(self, url: str, required_text: str | None = None) -> str | None:
+        """
+        HTML of the page, or None if it couldn't be fetched or doesn't have required_text (e.g. the server answered
+        with a challenge or a login page instead), so that the caller loads it in the browser instead.
+        """
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"HTTP fetch failed ({e}), using the browser.")
+            return None
+        if response.status_code != 200:
+            print(f"HTTP fetch failed (status {response.status_code}), using the browser.")
+            return None
+        if required_text is not None and required_text not in response.text:
+            return None
+        return response.text
+
+    def close(self):
+        self.session.close()
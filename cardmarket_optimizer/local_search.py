@@ -0,0 +1,238 @@
+import time
+
+from shipping import ShippingTable, ShippingTracker  # type:ignore[import-not-found]
+
+# ALGORITHM: Local search over the sellers of an existing solution (e.g. the one found by run_algo).
+#            For each paid seller A (the ones we pay shipping to), evaluate these moves:
+#              - Move: Move the items of A that can be bought cheaper from other paid sellers.
+#              - Drop: Move all the items of A to other paid sellers, so we save A's shipping.
+#              - Swap: Replace A by a seller B that isn't paid yet. Items go to B or to other paid sellers.
+#            Apply the move that saves the most and repeat until no move saves anything or the time limit is reached.
+#            The offers are indexed by seller and card once, and the paid sellers of each card are kept up to date.
+#            The cheapest copies of a card are looked up in the offers of its paid sellers only, so the cost of a move
+#            is calculated looking only at the items that are moved, not at the whole solution or all the offers.
+#            The shipping of a move is the change of the shipping price of the sellers involved
+#            (with tiered shipping, moving items can also make the shipping of a seller cheaper or more expensive).
+
+
+class LocalSearch:
+    def __init__(
+        self,
+        card_list: dict[str, int],
+        offers_database: dict[str, list[dict[str, int | float | str]]],
+        selected_offers: dict[str, list[dict[str, int | float | str]]],
+        shipping_tables: dict[str, ShippingTable] | None = None,
+    ):
+        self.card_names = [card_name for card_name in card_list if card_name in offers_database]
+        self.offers = {card_name: offers_database[card_name] for card_name in self.card_names}
+        # Without shipping tables, each seller has a single shipping price (the one of its offers).
+        if shipping_tables is None:
+            shipping_tables = {}
+            for offers in self.offers.values():
+                for offer in offers:
+                    if str(offer["seller"]) not in shipping_tables:
+                        shipping_tables[str(offer["seller"])] = ShippingTable(float(offer["shipping_price"]))
+        self.shipping = ShippingTracker(shipping_tables)
+        # Offers of each card sold by each seller.
+        self.seller_offers: dict[str, dict[str, list[tuple[float, int]]]] = {}
+        for card_name, offers in self.offers.items():
+            for i, offer in enumerate(offers):
+                seller = str(offer["seller"])
+                self.seller_offers.setdefault(seller, {}).setdefault(card_name, []).append((float(offer["price"]), i))
+        # Sellers of each card.
+        self.card_sellers: dict[str, set[str]] = {card_name: set() for card_name in self.card_names}
+        for seller, card_offers in self.seller_offers.items():
+            for card_name in card_offers:
+                self.card_sellers[card_name].add(seller)
+
+        # Copies bought from each offer, and items bought from each seller (the paid sellers).
+        self.used: dict[str, dict[int, int]] = {card_name: {} for card_name in self.card_names}
+        self.seller_items: dict[str, dict[tuple[str, int], int]] = {}
+        # Paid sellers of each card.
+        self.paid_sellers: dict[str, set[str]] = {card_name: set() for card_name in self.card_names}
+        for card_name, card_selected_offers in selected_offers.items():
+            if card_name not in self.offers:
+                continue
+            for selected_offer in card_selected_offers:
+                i = self._find_offer(card_name, selected_offer)
+                self._add(card_name, i, int(selected_offer["selected_amount"]))
+
+    def _find_offer(self, card_name: str, selected_offer: dict[str, int | float | str]) -> int:
+        """Find the offer in the database that corresponds to the selected offer."""
+        ignored_keys = {"selected_amount", "price_per_card"}
+        selected_fields = {key: value for key, value in selected_offer.items() if key not in ignored_keys}
+        for i, offer in enumerate(self.offers[card_name]):
+            if self.used[card_name].get(i, 0) + int(selected_offer["selected_amount"]) > int(offer["amount"]):
+                continue
+            if {key: value for key, value in offer.items() if key not in ignored_keys} == selected_fields:
+                return i
+        raise ValueError(f"Selected offer {selected_offer} not found in the offers of '{card_name}'.")
+
+    def _set_paid(self, seller: str, paid: bool):
+        for card_name in self.seller_offers[seller]:
+            if paid:
+                self.paid_sellers[card_name].add(seller)
+            else:
+                self.paid_sellers[card_name].discard(seller)
+
+    def _add(self, card_name: str, i: int, amount: int):
+        seller = str(self.offers[card_name][i]["seller"])
+        items = self.seller_items.setdefault(seller, {})
+        if not items:
+            self._set_paid(seller, True)
+        items[(card_name, i)] = items.get((card_name, i), 0) + amount
+        self.used[card_name][i] = self.used[card_name].get(i, 0) + amount
+        self.shipping.add(seller, amount, float(self.offers[card_name][i]["price"]) * amount)
+
+    def _remove(self, card_name: str, i: int, amount: int):
+        seller = str(self.offers[card_name][i]["seller"])
+        items = self.seller_items[seller]
+        self.shipping.add(seller, -amount, -float(self.offers[card_name][i]["price"]) * amount)
+        items[(card_name, i)] -= amount
+        if items[(card_name, i)] == 0:
+            del items[(card_name, i)]
+        self.used[card_name][i] -= amount
+        if self.used[card_name][i] == 0:
+            del self.used[card_name][i]
+        if not items:
+            del self.seller_items[seller]
+            self._set_paid(seller, False)
+
+    def _cheapest(
+        self,
+        card_name: str,
+        amount: int,
+        excluded_seller: str,
+        reserved: dict[tuple[str, int], int],
+        extra_seller: str | None = None,
+        max_price: float = float("inf"),
+    ) -> list[tuple[int, int, float]]:
+        """
+        Cheapest copies of a card (up to 'amount' and cheaper than max_price) from the paid sellers
+        and the extra seller, without using the excluded seller and the reserved copies.
+        """
+        # The sellers have few offers of each card, so sorting their offers is faster than merging them.
+        candidates = [
+            entry
+            for seller in self.paid_sellers[card_name]
+            if seller != excluded_seller
+            for entry in self.seller_offers[seller][card_name]
+        ]
+        if extra_seller is not None and extra_seller not in self.seller_items:
+            candidates.extend(self.seller_offers[extra_seller].get(card_name, []))
+        candidates.sort()
+        selection = []
+        for price, i in candidates:
+            if amount <= 0 or price >= max_price:
+                break
+            available = (
+                int(self.offers[card_name][i]["amount"])
+                - self.used[card_name].get(i, 0)
+                - reserved.get((card_name, i), 0)
+            )
+            if available <= 0:
+                continue
+            selected_amount = min(available, amount)
+            selection.append((i, selected_amount, price))
+            reserved[(card_name, i)] = reserved.get((card_name, i), 0) + selected_amount
+            amount -= selected_amount
+        return selection
+
+    def _plan(self, seller: str, full: bool, extra_seller: str | None = None):
+        """
+        Plan moving the items of the seller to other sellers.
+        If full, all the items must be moved (returns None if not possible), else only the ones that get cheaper.
+        Returns the change of the total price and the list of (card_name, old_offer, new_offer, amount) moves.
+        """
+        delta = 0.0
+        moves = []
+        # Articles and value added to (or removed from) each seller.
+        changes: dict[str, list[float]] = {}
+        reserved: dict[tuple[str, int], int] = {}
+        for (card_name, i), amount in self.seller_items[seller].items():
+            price = float(self.offers[card_name][i]["price"])
+            selection = self._cheapest(
+                card_name, amount, seller, reserved, extra_seller, float("inf") if full else price
+            )
+            moved = sum(selected_amount for _, selected_amount, _ in selection)
+            if full and moved < amount:
+                return None
+            for new_i, selected_amount, new_price in selection:
+                delta += (new_price - price) * selected_amount
+                moves.append((card_name, i, new_i, selected_amount))
+                for change_seller, articles, value in (
+                    (seller, -selected_amount, -price * selected_amount),
+                    (str(self.offers[card_name][new_i]["seller"]), selected_amount, new_price * selected_amount),
+                ):
+                    change = changes.setdefault(change_seller, [0, 0.0])
+                    change[0] += articles
+                    change[1] += value
+        if not moves:
+            return None
+        for change_seller, (articles, value) in changes.items():
+            delta += self.shipping.delta(change_seller, int(articles), value)
+        return delta, moves
+
+    def _swap_candidates(self, seller: str) -> set[str]:
+        """Unpaid sellers that sell all the cards of the seller that no other paid seller can supply."""
+        candidates: set[str] | None = None
+        reserved: dict[tuple[str, int], int] = {}
+        for (card_name, _), amount in self.seller_items[seller].items():
+            selection = self._cheapest(card_name, amount, seller, reserved)
+            if sum(selected_amount for _, selected_amount, _ in selection) == amount:
+                continue
+            card_sellers = self.card_sellers[card_name]
+            candidates = card_sellers if candidates is None else candidates & card_sellers
+        return (candidates or set()) - self.seller_items.keys()
+
+    def _best_move(self, seller: str, deadline: float = float("inf")):
+        """Best improving move of the seller, among the ones evaluated before the deadline (time.monotonic)."""
+        best = None
+        moves: list[tuple[bool, str | None]] = [(True, None), (False, None)]
+        moves.extend((True, other) for other in self._swap_candidates(seller))
+        for full, extra_seller in moves:
+            if time.monotonic() > deadline:
+                break
+            plan = self._plan(seller, full, extra_seller)
+            if plan is not None and plan[0] < -0.005 and (best is None or plan[0] < best[0]):
+                best = plan
+        return best
+
+    def run(self, time_limit: float = 10.0) -> tuple[float, int]:
+        """Apply improving moves until there are none left or the time limit is reached. Returns savings and moves."""
+        deadline = time.monotonic() + time_limit
+        saved = 0.0
+        num_moves = 0
+        improved = True
+        while improved:
+            improved = False
+            # Try first the sellers with the most expensive shipping per item.
+            sellers = sorted(
+                self.seller_items,
+                key=lambda x: -self.shipping.price(x) / sum(self.seller_items[x].values()),
+            )
+            for seller in sellers:
+                if time.monotonic() > deadline:
+                    return saved, num_moves
+                if seller not in self.seller_items:
+                    continue
+                move = self._best_move(seller, deadline)
+                if move is None:
+                    continue
+                delta, moves = move
+                for card_name, i, new_i, amount in moves:
+                    self._add(card_name, new_i, amount)
+                    self._remove(card_name, i, amount)
+                saved -= delta
+                num_moves += 1
+                improved = True
+        return saved, num_moves
+
+    def selected_offers(self) -> dict[str, list[dict[str, int | float | str]]]:
+        selected_offers: dict[str, list[dict[str, int | float | str]]] = {}
+        for card_name in self.card_names:
+            for i, amount in sorted(self.used[card_name].items()):
+                selected_offer = dict(self.offers[card_name][i])
+                selected_offer["selected_amount"] = amount
+                selected_offers.setdefault(card_name, []).append(selected_offer)
+        return selected_offers
@@ -0,0 +1,103 @@
+import math
+import time
+
+# BOUND: Lagrangian relaxation of the seller fixed-charge model of exact_solver.py.
+#        The demand constraints (buy exactly the amount needed of each card c) are moved to the objective,
+#        with a multiplier l[c] per card (a "price" we're paid for each copy of c we buy):
+#          L(l) = sum(l[c] * amount[c]) + sum over sellers s of min(0, shipping[s] + sum over cards c of v[s][c])
+#        where v[s][c] is the value of buying from s the copies of c cheaper than l[c], up to the amount needed:
+#          v[s][c] = sum((price[o] - l[c]) * copies of o) over the cheapest offers o of c from s with price[o] < l[c]
+#        Any l gives a lower bound of the cheapest solution. The multipliers are improved with subgradient steps
+#        (raise l[c] if we bought less copies of c than needed, lower it if more), keeping the best bound found.
+#        Each step only looks at the offers cheaper than l[c], so it's fast even with many offers.
+
+
+def lagrangian_bound(
+    card_list: dict[str, int],
+    offers_database: dict[str, list[dict[str, int | float | str]]],
+    sellers_cards_available: dict[str, dict[str, int | float]],
+    upper_bound: float,
+    time_limit: float = 2.0,
+    max_iterations: int = 500,
+) -> float:
+    """
+    Lower bound of the total price (items + shipping) of any selection of offers that buys the card list.
+    upper_bound is the total price of a known solution (e.g. the greedy one), used to size the subgradient steps.
+    """
+    start_time = time.monotonic()
+    # Offers of each card sorted by price, and amount to buy (can't buy more copies than the ones available).
+    card_offers: dict[str, list[tuple[float, int, str]]] = {}
+    cards_amount: dict[str, int] = {}
+    for card_name, amount in card_list.items():
+        if card_name not in offers_database or not offers_database[card_name]:
+            continue
+        offers = sorted(
+            (float(offer["price"]), int(offer["amount"]), str(offer["seller"])) for offer in offers_database[card_name]
+        )
+        card_offers[card_name] = offers
+        cards_amount[card_name] = min(amount, sum(offer_amount for _, offer_amount, _ in offers))
+    if not card_offers:
+        return 0.0
+
+    # Start with the price of the most expensive copy of the cheapest ones needed of each card.
+    multipliers: dict[str, float] = {}
+    for card_name, offers in card_offers.items():
+        amount_left = cards_amount[card_name]
+        for price, offer_amount, _ in offers:
+            multipliers[card_name] = price
+            amount_left -= offer_amount
+            if amount_left <= 0:
+                break
+
+    best_bound = 0.0
+    step_size = 2.0
+    iterations_without_improvement = 0
+    for _ in range(max_iterations):
+        if time.monotonic() - start_time > time_limit:
+            break
+        # Value of each seller and copies of each card bought from it.
+        sellers_value: dict[str, float] = {}
+        sellers_copies: dict[str, dict[str, int]] = {}
+        for card_name, offers in card_offers.items():
+            multiplier = multipliers[card_name]
+            for price, offer_amount, seller in offers:
+                if price >= multiplier:
+                    break
+                copies = sellers_copies.setdefault(seller, {})
+                selected_amount = min(offer_amount, cards_amount[card_name] - copies.get(card_name, 0))
+                if selected_amount <= 0:
+                    continue
+                copies[card_name] = copies.get(card_name, 0) + selected_amount
+                sellers_value[seller] = sellers_value.get(seller, 0.0) + (price - multiplier) * selected_amount
+
+        bound = sum(multipliers[card_name] * amount for card_name, amount in cards_amount.items())
+        bought = dict.fromkeys(cards_amount, 0)
+        for seller, value in sellers_value.items():
+            value += float(sellers_cards_available[seller]["shipping_price"])
+            if value < 0:
+                bound += value
+                for card_name, selected_amount in sellers_copies[seller].items():
+                    bought[card_name] += selected_amount
+
+        if bound > best_bound + 1e-9:
+            best_bound = bound
+            iterations_without_improvement = 0
+        else:
+            iterations_without_improvement += 1
+            if iterations_without_improvement >= 10:
+                step_size /= 2
+                iterations_without_improvement = 0
+                if step_size < 1e-4:
+                    break
+
+        subgradient = {card_name: amount - bought[card_name] for card_name, amount in cards_amount.items()}
+        norm = sum(value * value for value in subgradient.values())
+        if norm == 0:
+            # The relaxed solution buys exactly the amount needed of every card, so the bound can't be improved.
+            break
+        step = step_size * max(upper_bound - bound, 0.01) / norm
+        for card_name, value in subgradient.items():
+            multipliers[card_name] += step * value
+
+    # Round down, so that it's still a lower bound.
+    return math.floor(best_bound * 100) / 100
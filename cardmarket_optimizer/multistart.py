@@ -0,0 +1,72 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from card_stats import build_card_stats_index  # type:ignore[import-not-found]
+from greedy import calc_total_prices, run_algo  # type:ignore[import-not-found]
+from offer_store import OfferStore  # type:ignore[import-not-found]
+from shipping import ShippingTable, ShippingTracker  # type:ignore[import-not-found]
+
+# Runs the greedy algorithm many times, each time with a perturbed card order and random tie-breaks,
+# and keeps the cheapest solution. Restart 0 is always the unperturbed greedy algorithm.
+# Each restart has its own random generator, derived from the seed and the restart number,
+# so the results are the same regardless of the number of workers.
+
+# Data shared by all the restarts of a worker process. Set once per process by _init_worker.
+_shared: dict = {}
+
+
+def _init_worker(
+    card_list: dict[str, int],
+    offers_database: OfferStore,
+    sellers_cards_available: dict[str, dict[str, int | float]],
+    shipping_tables: dict[str, ShippingTable] | None,
+):
+    _shared["card_list"] = card_list
+    _shared["offers_database"] = offers_database
+    _shared["sellers_cards_available"] = sellers_cards_available
+    _shared["shipping_tables"] = shipping_tables
+
+
+def _run_restart(restart: int, seed: int) -> tuple[float, int, dict[str, list[dict[str, int | float | str]]]]:
+    offers_database: OfferStore = _shared["offers_database"]
+    shipping_tables: dict[str, ShippingTable] | None = _shared["shipping_tables"]
+    rng = random.Random(seed * 1_000_003 + restart) if restart > 0 else None
+    card_stats = build_card_stats_index(offers_database, _shared["card_list"])
+    selected_offers, _ = run_algo(
+        _shared["card_list"],
+        offers_database.snapshot(),
+        card_stats,
+        _shared["sellers_cards_available"],
+        rng=rng,
+        shipping=ShippingTracker(shipping_tables) if shipping_tables is not None else None,
+    )
+    total_price, _, _, _ = calc_total_prices(selected_offers, shipping_tables)
+    return total_price, restart, selected_offers
+
+
+def run_restarts(
+    card_list: dict[str, int],
+    offers_database: OfferStore,
+    sellers_cards_available: dict[str, dict[str, int | float]],
+    restarts: int,
+    workers: int = 1,
+    seed: int = 0,
+    verbose: bool = False,
+    shipping_tables: dict[str, ShippingTable] | None = None,
+) -> tuple[dict[str, list[dict[str, int | float | str]]], int]:
+    """Run the restarts (in parallel if workers > 1). Returns the cheapest selected offers and its restart number."""
+    # Each worker process gets its own copy of the data (pickled), so only the offers of the card list are sent.
+    initargs = (card_list, offers_database.subset(card_list), sellers_cards_available, shipping_tables)
+    restart_numbers = range(max(1, restarts))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            results = list(executor.map(_run_restart, restart_numbers, [seed] * len(restart_numbers)))
+    else:
+        _init_worker(*initargs)
+        results = [_run_restart(restart, seed) for restart in restart_numbers]
+
+    # Cheapest total price, and the lowest restart number when tied.
+    total_price, best_restart, selected_offers = min(results, key=lambda x: (x[0], x[1]))
+    if verbose:
+        print(f"Restarts: best {total_price} (restart {best_restart}), greedy {results[0][0]}.")
+    return selected_offers, best_restart
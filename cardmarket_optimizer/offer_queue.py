@@ -0,0 +1,128 @@
+import heapq
+import random
+
+from shipping import ShippingTracker  # type:ignore[import-not-found]
+
+# Priority queue with the offers of one card, ordered by price per card and then by biggest sellers.
+# Selects offers in exactly the same order as re-calculating the price per card of every offer, sorting the list
+# (stable sort) and popping the first offer, but only re-calculates the offers whose price per card can change:
+#   - The offers of a seller that was just selected (its shipping is now free).
+#   - The offers with more copies than the amount still needed (the shipping is now split among fewer copies).
+# To break ties in the same way as the stable sort, each offer has a label that represents its position
+# relative to the offers with the same key:
+#   - (1, index): The offer's key hasn't changed. Ties are broken by the original position in the list.
+#   - (0, -step, old_key, old_label): The key went up at 'step'. The stable sort places it before the offers
+#     that already had this key, and before the ones that went up in previous steps.
+#   - (2, step, old_key, old_label): The key went down at 'step'. The stable sort places it after the offers
+#     that already had this key, including the ones that went down in previous steps.
+# If a random generator is given, each offer gets a random number that is added at the end of the key,
+# so ties are broken randomly instead.
+# If a shipping tracker is given, the shipping price of an offer is how much the seller's shipping price goes up
+# when the offer is bought (with tiered shipping it can go up again with more articles), so the offers of the
+# seller of the selected offer are re-calculated after every selection, not only the first one.
+
+
+class OfferQueue:
+    def __init__(
+        self,
+        offers,
+        sellers_cards_available: dict[str, dict[str, int | float]],
+        rng: random.Random | None = None,
+        shipping: ShippingTracker | None = None,
+    ):
+        self.offers = offers
+        self.shipping = shipping
+        # Offer fields used to calculate the keys, converted only once.
+        self.prices = [float(offer["price"]) for offer in offers]
+        self.amounts = [int(offer["amount"]) for offer in offers]
+        self.shipping_prices = [float(offer["shipping_price"]) for offer in offers]
+        self.sellers = [str(offer["seller"]) for offer in offers]
+        self.sellers_priority = [-int(sellers_cards_available[seller]["cards_available"]) for seller in self.sellers]
+        self.tie_breaks = [rng.random() for _ in offers] if rng is not None else None
+        self.keys: list[tuple] = []
+        self.labels: list[tuple] = [(1, i) for i in range(len(offers))]
+        self.heap: list[tuple[tuple, tuple, int]] = []
+        self.removed: set[int] = set()
+        # Offers grouped by amount and by seller, to find the ones to re-calculate.
+        self.by_amount: dict[int, list[int]] = {}
+        self.by_seller: dict[str, list[int]] = {}
+        for i in range(len(offers)):
+            self.by_amount.setdefault(self.amounts[i], []).append(i)
+            self.by_seller.setdefault(self.sellers[i], []).append(i)
+        self.amount: int | None = None
+        self.changed_seller: str | None = None
+        self.step = 0
+
+    def _calc_key(self, i: int, amount: int, selected_sellers: set[str]) -> tuple:
+        selected_amount = min(self.amounts[i], amount)
+        if self.shipping is not None:
+            shipping_price = self.shipping.delta(self.sellers[i], selected_amount, self.prices[i] * selected_amount)
+        else:
+            shipping_price = self.shipping_prices[i] if self.sellers[i] not in selected_sellers else 0.0
+        total_price_selected_amount = round(self.prices[i] * selected_amount + shipping_price, 2)
+        price_per_card = round(total_price_selected_amount / selected_amount, 2)
+        if self.tie_breaks is not None:
+            return price_per_card, self.sellers_priority[i], self.tie_breaks[i]
+        return price_per_card, self.sellers_priority[i]
+
+    def _update(self, indexes, amount: int, selected_sellers: set[str]):
+        changed = []
+        for i in indexes:
+            if i in self.removed:
+                continue
+            old_key = self.keys[i]
+            key = self._calc_key(i, amount, selected_sellers)
+            if key != old_key:
+                changed.append((i, old_key, key))
+        for i, old_key, key in changed:
+            if key > old_key:
+                label: tuple = (0, -self.step, old_key, self.labels[i])
+            else:
+                label = (2, self.step, old_key, self.labels[i])
+            self.keys[i] = key
+            self.labels[i] = label
+            heapq.heappush(self.heap, (key, label, i))
+
+    def pop(self, amount: int, selected_sellers: set[str]):
+        """
+        Select the best offer for the amount of copies still needed and remove it from the queue.
+        Returns the offer and a copy of it with the fields 'selected_amount' and 'price_per_card' added.
+        Adds the seller of the selected offer to selected_sellers, and the selected copies to the shipping tracker.
+        selected_sellers and the shipping tracker must not be modified by anything else while this queue is in use.
+        """
+        self.step += 1
+        if self.amount is None:
+            self.keys = [self._calc_key(i, amount, selected_sellers) for i in range(len(self.offers))]
+            self.heap = [(key, self.labels[i], i) for i, key in enumerate(self.keys)]
+            heapq.heapify(self.heap)
+        else:
+            indexes: list[int] = []
+            if amount < self.amount:
+                for offer_amount, offer_indexes in self.by_amount.items():
+                    if offer_amount > amount:
+                        indexes.extend(offer_indexes)
+            if self.changed_seller is not None:
+                indexes.extend(self.by_seller[self.changed_seller])
+            self._update(indexes, amount, selected_sellers)
+        self.amount = amount
+
+        while True:
+            key, label, i = heapq.heappop(self.heap)  # Raises IndexError when there are no offers left.
+            if i not in self.removed and label is self.labels[i]:
+                break
+        self.removed.add(i)
+
+        offer = self.offers[i]
+        selected_offer = dict(offer)
+        selected_offer["selected_amount"] = min(self.amounts[i], amount)
+        selected_offer["price_per_card"] = key[0]
+        seller = self.sellers[i]
+        if self.shipping is not None:
+            self.shipping.add(
+                seller, selected_offer["selected_amount"], self.prices[i] * selected_offer["selected_amount"]
+            )
+            self.changed_seller = seller
+        else:
+            self.changed_seller = seller if seller not in selected_sellers else None
+        selected_sellers.add(seller)
+        return offer, selected_offer
@@ -0,0 +1,91 @@
+import json
+from pathlib import Path
+from types import MappingProxyType
+
+
+class OfferStore:
+    """
+    Offers database loaded once and never modified (offers are read-only mappings).
+    Algorithms that need to remove offers (e.g. run_algo) work on a snapshot of the store,
+    so any number of passes can share the same loaded data.
+    """
+
+    def __init__(self, offers_database: dict[str, list[dict[str, int | float | str]]]):
+        self.offers: dict[str, tuple[MappingProxyType, ...]] = {
+            card_name: tuple(MappingProxyType(offer) for offer in offers)
+            for card_name, offers in offers_database.items()
+        }
+        self.positions: dict[str, dict[int, int]] = {}
+
+    def __getstate__(self):
+        # Read-only mappings can't be pickled (e.g. to send the store to worker processes), so pickle plain dicts.
+        return {card_name: [dict(offer) for offer in offers] for card_name, offers in self.offers.items()}
+
+    def __setstate__(self, state: dict[str, list[dict[str, int | float | str]]]):
+        self.__init__(state)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "OfferStore":
+        with Path(path).open("r", encoding="utf-8") as fp:
+            return cls(json.load(fp))
+
+    def __contains__(self, card_name: object) -> bool:
+        return card_name in self.offers
+
+    def __getitem__(self, card_name: str) -> tuple[MappingProxyType, ...]:
+        return self.offers[card_name]
+
+    def keys(self):
+        return self.offers.keys()
+
+    def position(self, card_name: str, offer: MappingProxyType) -> int:
+        """Position of the offer in the card's offers."""
+        if card_name not in self.positions:
+            self.positions[card_name] = {id(card_offer): i for i, card_offer in enumerate(self.offers[card_name])}
+        return self.positions[card_name][id(offer)]
+
+    def subset(self, card_names) -> "OfferStore":
+        """Store with only the offers of the given cards, shared with this one (nothing is copied)."""
+        store = OfferStore({})
+        store.offers = {card_name: self.offers[card_name] for card_name in card_names if card_name in self.offers}
+        return store
+
+    def snapshot(self) -> "OfferSnapshot":
+        return OfferSnapshot(self)
+
+
+class OfferSnapshot:
+    """
+    View of an OfferStore where offers can be removed.
+    Removals are recorded in an undo log, so the snapshot can be rolled back to any earlier point.
+    """
+
+    def __init__(self, store: OfferStore):
+        self.store = store
+        self.removed: dict[str, set[int]] = {}
+        self.undo_log: list[tuple[str, int]] = []
+
+    def __contains__(self, card_name: object) -> bool:
+        return card_name in self.store
+
+    def __getitem__(self, card_name: str) -> list[MappingProxyType]:
+        """Offers of the card that haven't been removed."""
+        removed = self.removed.get(card_name)
+        if not removed:
+            return list(self.store[card_name])
+        return [offer for i, offer in enumerate(self.store[card_name]) if i not in removed]
+
+    def remove(self, card_name: str, offer: MappingProxyType):
+        position = self.store.position(card_name, offer)
+        self.removed.setdefault(card_name, set()).add(position)
+        self.undo_log.append((card_name, position))
+
+    def mark(self) -> int:
+        """Current point of the undo log, to be used with rollback."""
+        return len(self.undo_log)
+
+    def rollback(self, mark: int = 0):
+        """Restore the offers removed after the mark (by default, all of them)."""
+        while len(self.undo_log) > mark:
+            card_name, position = self.undo_log.pop()
+            self.removed[card_name].discard(position)
@@ -1,9 +1,30 @@
 import argparse
 import json
-import math
 import re
 from pathlib import Path
 
+from card_stats import build_card_stats_index  # type:ignore[import-not-found]
+from greedy import calc_sellers_cards_available, calc_total_prices, run_algo  # type:ignore[import-not-found]
+from local_search import LocalSearch  # type:ignore[import-not-found]
+from lower_bound import lagrangian_bound  # type:ignore[import-not-found]
+from multistart import run_restarts  # type:ignore[import-not-found]
+from offer_store import OfferStore  # type:ignore[import-not-found]
+from shipping import ShippingTracker, get_shipping_tables  # type:ignore[import-not-found]
+from sqlite_store import SqliteStore  # type:ignore[import-not-found]
+
+# Options of Optimizer.solve. Same as the command line arguments.
+DEFAULT_OPTIONS: dict[str, str | int | float | bool] = {
+    "solver": "greedy",
+    "max_gap": 0.02,
+    "lower_bound_time_limit": 2.0,
+    "restarts": 1,
+    "workers": 1,
+    "seed": 0,
+    "local_search_time_limit": 10.0,
+    "time_limit": 60.0,
+    "verbose": False,
+}
+
 
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -26,182 +47,282 @@ def parse_args():
         default="offers_database.json",
         help="Path to input offers database file (default offers_database.json).",
     )
+    parser.add_argument(
+        "--database",
+        "-d",
+        default=None,
+        help="Path to input SQLite database (see sqlite_store.py). If given, the offers and sellers are read from it "
+        "(only the cards in the card list) instead of from the JSON files.",
+    )
     parser.add_argument(
         "--selected-offers",
         "-e",
         default="selected_offers.json",
         help="Path to output selected offers file (default selected_offers.json).",
     )
+    parser.add_argument(
+        "--solver",
+        choices=["greedy", "exact", "auto"],
+        default=DEFAULT_OPTIONS["solver"],
+        help="Algorithm used to select the offers. 'exact' solves a MILP with branch-and-bound until it's proven "
+        "optimal or the time limit is reached, and falls back to the cheapest purchase from the sellers of the greedy "
+        "solution if that's cheaper than the best solution found. Unlike 'greedy', it buys the copies available of "
+        "the cards that don't have enough. 'auto' only runs the exact solver when the optimality gap of the greedy "
+        "solution is bigger than --max-gap (default greedy).",
+    )
+    parser.add_argument(
+        "--max-gap",
+        type=float,
+        default=DEFAULT_OPTIONS["max_gap"],
+        help="Optimality gap (relative to the lower bound) above which the 'auto' solver runs the exact solver "
+        "(default 0.02).",
+    )
+    parser.add_argument(
+        "--lower-bound-time-limit",
+        type=float,
+        default=DEFAULT_OPTIONS["lower_bound_time_limit"],
+        help="Time limit in seconds for the lower bound calculation (default 2).",
+    )
+    parser.add_argument(
+        "--restarts",
+        type=int,
+        default=DEFAULT_OPTIONS["restarts"],
+        help="Number of times the greedy algorithm is run with a randomized card order and tie-breaks, "
+        "keeping the cheapest solution. The first run is always the non-randomized one (default 1).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_OPTIONS["workers"],
+        help="Number of processes used to run the restarts in parallel (default 1). Each process holds its own copy "
+        "of the offers of the cards in the card list.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=DEFAULT_OPTIONS["seed"],
+        help="Seed of the randomized restarts. The same seed gives the same result (default 0).",
+    )
+    parser.add_argument(
+        "--local-search-time-limit",
+        type=float,
+        default=DEFAULT_OPTIONS["local_search_time_limit"],
+        help="Time limit in seconds for the local search that improves the greedy solution (default 10).",
+    )
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        default=DEFAULT_OPTIONS["time_limit"],
+        help="Time limit in seconds for the exact solver (default 60).",
+    )
 
     args = parser.parse_args()
     return args
 
 
-args = parse_args()
-
-card_list: dict[str, int] = {}
-with Path(args.card_list).open("r", encoding="utf-8") as fp:
-    for line in fp:
-        pattern = re.compile(r"\s+")
-        line = pattern.sub(" ", line).strip()
-        card_name = line
-        amount = 1
-        parts = line.split(" ", maxsplit=1)
-        if len(parts) == 2:
-            if parts[0].isdigit():
-                card_name = parts[1]
-                amount = int(parts[0])
-        if len(card_name) > 0:
-            card_name = re.sub(r"(.*?[^/]) *//? *([^/].*)", r"\1 // \2", card_name).lower()
-            card_list[card_name] = card_list.get(card_name, 0) + amount
-
-offers_database: dict[str, list[dict[str, int | float | str]]] = json.load(
-    Path(args.offers_database).open("r", encoding="utf-8")
-)
-
-sellers_database: dict[str, float] = json.load(Path(args.sellers_database).open("r", encoding="utf-8"))
-
-sellers_db_cards_available: dict[str, dict[str, int | float]] = {
-    seller: {"shipping_price": shipping_price, "cards_available": 0}
-    for seller, shipping_price in sellers_database.items()
-}
-for card_name, amount in card_list.items():
-    if card_name not in offers_database:
-        continue
-    for offer in offers_database[card_name]:
-        selected_amount = int(offer["amount"]) if amount >= int(offer["amount"]) else amount
-        if offer["seller"] not in sellers_database:
-            sellers_db_cards_available[str(offer["seller"])] = {
-                "shipping_price": float(offer["shipping_price"]),
-                "cards_available": 0,
-            }
-        sellers_db_cards_available[str(offer["seller"])]["cards_available"] += selected_amount
-
-
-def calc_total_prices(selected_offers: dict[str, list[dict[str, int | float | str]]]):
-    total_price = 0.0
-    items_price = 0.0
-    shipping_price = 0.0
-    seen_sellers = set()
-
-    for offers in selected_offers.values():
-        for offer in offers:
-            offer_items_price = float(offer["price"]) * int(offer["selected_amount"])
-            if offer["seller"] not in seen_sellers:
-                offer_shipping_price = float(offer["shipping_price"])
-                seen_sellers.add(offer["seller"])
+def parse_card_list(path: str | Path) -> dict[str, int]:
+    """Read a card list file, with one card per line and optionally the amount before the name ("4 Card Name")."""
+    card_list: dict[str, int] = {}
+    with Path(path).open("r", encoding="utf-8") as fp:
+        for line in fp:
+            pattern = re.compile(r"\s+")
+            line = pattern.sub(" ", line).strip()
+            card_name = line
+            amount = 1
+            parts = line.split(" ", maxsplit=1)
+            if len(parts) == 2:
+                if parts[0].isdigit():
+                    card_name = parts[1]
+                    amount = int(parts[0])
+            if len(card_name) > 0:
+                card_name = re.sub(r"(.*?[^/]) *//? *([^/].*)", r"\1 // \2", card_name).lower()
+                card_list[card_name] = card_list.get(card_name, 0) + amount
+    return card_list
+
+
+class Optimizer:
+    """
+    Offers and sellers databases loaded once, to optimize any number of card lists against them:
+        optimizer = Optimizer.load("offers_database.json", "sellers_database.json")
+        result = optimizer.solve({"card name": 4}, {"restarts": 8})
+    """
+
+    def __init__(
+        self,
+        offers_database: OfferStore,
+        sellers_database: dict[str, float | list[dict[str, int | float]]],
+    ):
+        self.offers_database = offers_database
+        # Shipping price of each seller, a single price or a table of tiers (see shipping.py).
+        self.sellers_database = sellers_database
+        self.shipping_tables = get_shipping_tables(sellers_database, offers_database, offers_database.keys())
+
+    @classmethod
+    def load(cls, offers_database_path: str | Path, sellers_database_path: str | Path) -> "Optimizer":
+        # Loaded only once. Every pass reads from this store, passes that remove offers use a snapshot of it.
+        offers_database = OfferStore.load(offers_database_path)
+        with Path(sellers_database_path).open("r", encoding="utf-8") as fp:
+            sellers_database = json.load(fp)
+        return cls(offers_database, sellers_database)
+
+    @classmethod
+    def load_sqlite(cls, database_path: str | Path, card_names=None) -> "Optimizer":
+        """Load the offers of the given cards (or of all cards) from the SQLite database."""
+        with SqliteStore(database_path) as store:
+            return cls(OfferStore(store.get_offers(card_names)), store.get_sellers())
+
+    def _run_heuristic(
+        self,
+        card_list: dict[str, int],
+        options: dict[str, str | int | float | bool],
+        sellers_db_cards_available: dict[str, dict[str, int | float]],
+    ) -> dict[str, list[dict[str, int | float | str]]]:
+        """Greedy algorithm (with restarts, if any) improved with local search."""
+        verbose = bool(options["verbose"])
+        offers_database = self.offers_database
+
+        if int(options["restarts"]) > 1:
+            # Run the greedy algorithm several times with randomized card order and tie-breaks, keep the cheapest.
+            selected_offers, _ = run_restarts(
+                card_list,
+                offers_database,
+                sellers_db_cards_available,
+                int(options["restarts"]),
+                int(options["workers"]),
+                int(options["seed"]),
+                verbose=verbose,
+                shipping_tables=self.shipping_tables,
+            )
+        else:
+            card_stats = build_card_stats_index(offers_database, card_list)
+            selected_offers, _ = run_algo(
+                card_list,
+                offers_database.snapshot(),
+                card_stats,
+                sellers_db_cards_available,
+                shipping=ShippingTracker(self.shipping_tables),
+            )
+
+        if verbose:
+            total_price, items_price, shipping_price, sellers = calc_total_prices(selected_offers, self.shipping_tables)
+            print(f"Greedy: {total_price=} {items_price=} {shipping_price=} {len(sellers)=}")
+
+        if float(options["local_search_time_limit"]) > 0:
+            # Improve the greedy solution by moving items between sellers, dropping sellers and swapping sellers.
+            local_search = LocalSearch(card_list, offers_database, selected_offers, self.shipping_tables)
+            saved, num_moves = local_search.run(float(options["local_search_time_limit"]))
+            selected_offers = local_search.selected_offers()
+            if verbose:
+                print(f"Local search: saved {round(saved, 2)} with {num_moves} moves.")
+        return selected_offers
+
+    def solve(
+        self,
+        card_list: dict[str, int],
+        options: dict[str, str | int | float | bool] | None = None,
+    ) -> dict:
+        """
+        Select the offers to buy the card list. Options not given take the value of DEFAULT_OPTIONS.
+        Returns a dict with the selected offers (same format as the selected offers file), the total, items and
+        shipping prices, the selected sellers, the lower bound and the optimality gap of the greedy solution,
+        and whether the exact solver proved the solution optimal.
+        """
+        options = {**DEFAULT_OPTIONS, **(options or {})}
+        verbose = bool(options["verbose"])
+        offers_database = self.offers_database
+        sellers_db_cards_available = calc_sellers_cards_available(card_list, offers_database, self.sellers_database)
+
+        # The greedy algorithm can't buy a card with fewer copies than needed (it runs out of offers), the exact solver
+        # buys the copies available instead, without starting from the greedy solution.
+        short_cards = [
+            card_name
+            for card_name, amount in card_list.items()
+            if card_name in offers_database
+            and sum(int(offer["amount"]) for offer in offers_database[card_name]) < amount
+        ]
+        selected_offers: dict[str, list[dict[str, int | float | str]]] | None = None
+        if not short_cards or options["solver"] == "greedy":
+            selected_offers = self._run_heuristic(card_list, options, sellers_db_cards_available)
+        elif verbose:
+            print(f"Greedy: Skipped, not enough copies of {', '.join(short_cards)}.")
+
+        total_price, items_price, shipping_price, sellers = float("inf"), 0.0, 0.0, set()
+        lower_bound = None
+        gap = None
+        if selected_offers is not None:
+            total_price, items_price, shipping_price, sellers = calc_total_prices(selected_offers, self.shipping_tables)
+            if float(options["lower_bound_time_limit"]) > 0:
+                # How far the heuristic's (greedy and local search) solution can be from the optimal one.
+                lower_bound = lagrangian_bound(
+                    card_list,
+                    offers_database,
+                    sellers_db_cards_available,
+                    total_price,
+                    float(options["lower_bound_time_limit"]),
+                )
+                gap = (total_price - lower_bound) / lower_bound if lower_bound > 0 else 0.0
+                if verbose:
+                    print(
+                        f"Heuristic: {total_price=} {items_price=} {shipping_price=} {len(sellers)=} "
+                        f"{lower_bound=} gap={gap:.2%}"
+                    )
+
+        optimal = False
+        if options["solver"] == "exact" or (
+            options["solver"] == "auto" and (gap is None or gap > float(options["max_gap"]))
+        ):
+            from exact_solver import solve_exact  # type:ignore[import-not-found]
+
+            exact_offers, optimal = solve_exact(
+                card_list,
+                offers_database,
+                self.sellers_database,
+                float(options["time_limit"]),
+                incumbent_sellers=sellers,
+                verbose=verbose,
+            )
+            if verbose and not optimal:
+                print("Warning: Time limit reached, the solution may not be optimal.")
+            # Keep the cheaper of the solver's and the heuristic's selections, priced the same way.
+            exact_prices = calc_total_prices(exact_offers, self.shipping_tables)
+            if selected_offers is None or (exact_offers and exact_prices[0] <= total_price):
+                selected_offers = exact_offers
+                total_price, items_price, shipping_price, sellers = exact_prices
             else:
-                offer_shipping_price = 0.0
-            offer_total_price = offer_items_price + offer_shipping_price
-            total_price += offer_total_price
-            items_price += offer_items_price
-            shipping_price += offer_shipping_price
-
-    return round(total_price, 2), round(items_price, 2), round(shipping_price, 2), seen_sellers
-
-
-# ALGORITHM: Before running the algorithm, sort the cards by amount and then by price.
-#            Selects as many as possible for each offer. Then calculates the total price for each offer.
-#            Then calculates the per-card price for each offer. Then orders the offers by per-card price.
-#            Then selects the cheapest one, and if tied the one with the seller with most cards.
-#            Then calculates the remaining needed amount. Then does the whole process again until we buy all needed cards.
-#            Takes into account that if the card is from a seller that was selected previously,
-#            the shipping should be effectively free for this card, since the shipping was already considered previously.
-
-
-def average_offer_by_key(offers: list[dict[str, int | float | str]], key: str) -> float:
-    """Compute average of 'key' from a list of offers."""
-    prices = sorted(float(offer[key]) for offer in offers if key in offer)
-    prices = prices[: math.ceil(len(prices) / 2)]
-    return round(sum(prices) / len(prices), 2) if prices else 0.0
-
-
-def get_best_offer(offers: list[dict[str, int | float | str]], amount: int, selected_sellers: set[str]):
-    # Beware: This function modifies the offers list and the items inside it.
-    for offer in offers:
-        # Select amount of cards needed from this offer.
-        selected_amount = int(offer["amount"]) if amount >= int(offer["amount"]) else amount
-        offer["selected_amount"] = selected_amount
-        # Calculate the price per card. Using only the number of cards actually available from the seller.
-        shipping_price = float(offer["shipping_price"]) if offer["seller"] not in selected_sellers else 0.0
-        total_price_selected_amount = round(float(offer["price"]) * selected_amount + shipping_price, 2)
-        offer["price_per_card"] = round(total_price_selected_amount / selected_amount, 2)
-    # Sort cards by price per card and then by biggest sellers.
-    # Then selects the first one of the list and removes it so that it's not considered in the next iteration.
-    offers.sort(
-        key=lambda x: (x["price_per_card"], -int(sellers_db_cards_available[str(x["seller"])]["cards_available"])),
-    )
-    selected_offer = offers.pop(0)
-    selected_sellers.add(str(selected_offer["seller"]))
-    return selected_offer
-
-
-def run_algo(
-    card_list: dict[str, int],
-    offers_database: dict[str, list[dict[str, int | float | str]]],
-    selected_offers: dict[str, list[dict[str, int | float | str]]] | None = None,
-    selected_sellers: set[str] | None = None,
-) -> tuple[dict[str, list[dict[str, int | float | str]]], set[str]]:
-    # Sort by least offers, then most amount of cards in card list and then by most expensive.
-    # Helps prioritizing selecting sellers with more copies of a card and cheaper sellers for expensive cards.
-    card_list = dict(
-        sorted(
-            card_list.items(),
-            key=lambda x: (
-                len(offers_database[x[0]]),  # Least offers
-                -x[1],  # Most needed
-                -average_offer_by_key(offers_database[x[0]], "price"),  # Most expensive
-            ),
-        )
-    )
-
-    if selected_offers is None:
-        selected_offers = {}
-    if selected_sellers is None:
-        selected_sellers = set()
-    for card_name, amount in card_list.items():
-        if card_name not in offers_database:
-            continue
-        selected_offers[card_name] = []
-        amount_left = amount
-        while amount_left > 0:
-            selected_offer = get_best_offer(offers_database[card_name], amount_left, selected_sellers)
-            selected_offers[card_name].append(selected_offer)
-            amount_left -= selected_offer["selected_amount"]
-
-    return selected_offers, selected_sellers
-
-
-selected_offers, selected_sellers = run_algo(card_list, offers_database)
-
-
-# Get the sellers with only 1 item and try to see if we can reassign that item to a different, but already-selected seller
-# so that we can save the shipping of the current seller.
-
-
-selected_offers_by_seller: dict[str, list[dict[str, int | float | str]]] = {}
-for card_name, offers in selected_offers.items():
-    for offer in offers:
-        if offer["seller"] not in selected_offers_by_seller:
-            selected_offers_by_seller[str(offer["seller"])] = []
-        offer["card_name"] = card_name
-        selected_offers_by_seller[str(offer["seller"])].append(offer)
-
-new_card_list: dict[str, int] = {}
-for seller, offers in selected_offers_by_seller.items():
-    if sum(int(offer["selected_amount"]) for offer in offers) == 1:
-        selected_sellers.remove(seller)
-        new_card_list[str(offers[0]["card_name"])] = 1
-        for card_name, sel_ofrs in tuple(selected_offers.items()):
-            for i, sel_ofr in enumerate(sel_ofrs):
-                if offers[0] == sel_ofr:
-                    sel_ofrs.pop(i)
-                    if len(sel_ofrs) == 0:
-                        selected_offers.pop(card_name)
-
-offers_database = json.load(Path(args.offers_database).open("r", encoding="utf-8"))
-
-selected_offers, selected_sellers = run_algo(new_card_list, offers_database, selected_offers, selected_sellers)
-json.dump(selected_offers, Path(args.selected_offers).open("w"), indent=2, sort_keys=True)
-total_price, items_price, shipping_price, sellers = calc_total_prices(selected_offers)
-print(f"{total_price=} {items_price=} {shipping_price=} {len(sellers)=}")
+                optimal = False
+                if verbose:
+                    print(f"Exact solver: {exact_prices[0]} isn't cheaper than {total_price}, keeping the heuristic's.")
+
+        return {
+            "selected_offers": selected_offers,
+            "total_price": total_price,
+            "items_price": items_price,
+            "shipping_price": shipping_price,
+            "sellers": sellers,
+            "lower_bound": lower_bound,
+            "gap": gap,
+            "optimal": optimal,
+        }
+
+
+def main():
+    args = parse_args()
+    card_list = parse_card_list(args.card_list)
+    if args.database is not None:
+        optimizer = Optimizer.load_sqlite(args.database, card_list)
+    else:
+        optimizer = Optimizer.load(args.offers_database, args.sellers_database)
+    options = {key: getattr(args, key) for key in DEFAULT_OPTIONS if key != "verbose"}
+    result = optimizer.solve(card_list, {**options, "verbose": True})
+
+    with Path(args.selected_offers).open("w") as fp:
+        json.dump(result["selected_offers"], fp, indent=2, sort_keys=True)
+    total_price = result["total_price"]
+    items_price = result["items_price"]
+    shipping_price = result["shipping_price"]
+    sellers = result["sellers"]
+    print(f"{total_price=} {items_price=} {shipping_price=} {len(sellers)=}")
+
+
+if __name__ == "__main__":
+    main()
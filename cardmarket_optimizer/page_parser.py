@@ -0,0 +1,292 @@
+from html.parser import HTMLParser
+
+# Parses a page's HTML (e.g. driver.page_source) into a light element tree, so that all the data of a page can be
+# read with one WebDriver call instead of one find_element call per field.
+# The helpers below follow the XPath conditions used with Selenium: contains(@class, ...) is a substring match and
+# the text of an element is the text of all its descendants, with the whitespace collapsed.
+
+VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+}
+IGNORED_ELEMENTS = {"script", "style", "template"}
+
+
+class Element:
+    def __init__(self, tag: str, attrs: dict[str, str], parent: "Element | None" = None):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children: list[Element] = []
+        # Text nodes and child elements, in document order.
+        self.content: list[str | Element] = []
+
+    def get(self, name: str, default: str = "") -> str:
+        return self.attrs.get(name, default)
+
+    def data_attributes(self) -> dict[str, str]:
+        """data-* attributes without the prefix, e.g. {"shipping-price": "1.25"}."""
+        return {name[5:]: value for name, value in self.attrs.items() if name.startswith("data-")}
+
+    def has_class(self, name: str) -> bool:
+        """Like contains(@class, name) in XPath (substring of the class attribute)."""
+        return name in self.attrs.get("class", "")
+
+    @property
+    def text(self) -> str:
+        parts: list[str] = []
+        stack: list[str | Element] = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                stack.extend(reversed(node.content))
+        return " ".join("".join(parts).split())
+
+    def iter(self, tag: str | None = None):
+        """Descendants of the element (not the element itself), in document order."""
+        stack = list(reversed(self.children))
+        while stack:
+            element = stack.pop()
+            if tag is None or element.tag == tag:
+                yield element
+            stack.extend(reversed(element.children))
+
+    def find(self, tag: str, condition=None) -> "Element | None":
+        """First descendant with the tag that meets the condition (like .//tag[condition])."""
+        for element in self.iter(tag):
+            if condition is None or condition(element):
+                return element
+        return None
+
+    def find_all(self, tag: str, condition=None) -> list["Element"]:
+        return [element for element in self.iter(tag) if condition is None or condition(element)]
+
+    def find_path(self, *steps: tuple[str, object]) -> "Element | None":
+        """
+        First element of a path of (tag, condition) steps, each one a descendant of the previous one,
+        e.g. find_path(("div", cond1), ("span", cond2)) is like .//div[cond1]//span[cond2].
+        """
+        candidates = [self]
+        for tag, condition in steps:
+            found = []
+            for candidate in candidates:
+                found.extend(candidate.find_all(tag, condition))  # type:ignore[arg-type]
+            if not found:
+                return None
+            candidates = found
+        return candidates[0]
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element("document", {})
+        self.current = self.root
+        self.ignored_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self.ignored_depth or tag in IGNORED_ELEMENTS:
+            if tag in IGNORED_ELEMENTS:
+                self.ignored_depth += 1
+            return
+        element = Element(tag, {name: value or "" for name, value in attrs}, self.current)
+        self.current.children.append(element)
+        self.current.content.append(element)
+        if tag not in VOID_ELEMENTS:
+            self.current = element
+
+    def handle_startendtag(self, tag, attrs):
+        if self.ignored_depth:
+            return
+        element = Element(tag, {name: value or "" for name, value in attrs}, self.current)
+        self.current.children.append(element)
+        self.current.content.append(element)
+
+    def handle_endtag(self, tag):
+        if tag in IGNORED_ELEMENTS:
+            self.ignored_depth = max(0, self.ignored_depth - 1)
+            return
+        if self.ignored_depth or tag in VOID_ELEMENTS:
+            return
+        # Close the element and any unclosed elements inside it. End tags without a start tag are ignored.
+        element: Element | None = self.current
+        while element is not None and element.tag != tag:
+            element = element.parent
+        if element is not None and element.parent is not None:
+            self.current = element.parent
+
+    def handle_data(self, data):
+        if not self.ignored_depth:
+            self.current.content.append(data)
+
+
+def parse_html(html: str) -> Element:
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def parse_offer_rows(html: str) -> list[dict[str, str | bool]]:
+    """
+    Data of every row of the offers table of a card page, with the same elements that get_row_data used to read
+    with find_element: row id, whether it has the "Put in shopping cart" button, seller, condition, language,
+    amount and price (as the texts shown on the page).
+    """
+    rows = []
+    # Only the offers table is parsed (the header, filters and footer are most of the page).
+    start = html.find('class="table-body"')
+    if start >= 0:
+        end = html.find("</section>", start)
+        html = html[html.rfind("<", 0, start) : end if end >= 0 else len(html)]
+    root = parse_html(html)
+    for table_body in root.find_all("div", lambda x: x.get("class") == "table-body"):
+        for row in table_body.children:
+            if row.tag != "div" or "articleRow" not in row.get("id"):
+                continue
+            seller = row.find_path(
+                ("div", lambda x: x.has_class("col-sellerProductInfo")),
+                ("span", lambda x: x.has_class("seller-name")),
+                ("a", None),
+            )
+            product_attributes = row.find_path(
+                ("div", lambda x: x.has_class("col-product")),
+                ("div", lambda x: x.has_class("product-attributes")),
+            )
+            condition = None
+            language = None
+            if product_attributes is not None:
+                for child in product_attributes.children:
+                    if condition is None and child.tag == "a" and child.has_class("article-condition"):
+                        condition = next((x for x in child.children if x.tag == "span"), None)
+                    if language is None and child.tag == "span" and "aria-label" in child.attrs:
+                        language = child
+            amount = row.find_path(
+                ("div", lambda x: x.has_class("col-offer")),
+                ("div", lambda x: x.has_class("amount-container")),
+                ("span", None),
+            )
+            price = row.find_path(
+                ("div", lambda x: x.has_class("col-offer")),
+                ("div", lambda x: x.has_class("price-container")),
+                ("span", lambda x: "€" in "".join(y for y in x.content if isinstance(y, str))),
+            )
+            rows.append(
+                {
+                    "id": row.get("id"),
+                    "has_cart_button": row.find("button", lambda x: x.get("aria-label") == "Put in shopping cart")
+                    is not None,
+                    "seller": seller.text if seller is not None else "",
+                    "condition": condition.text if condition is not None else "",
+                    "language": language.get("aria-label").strip() if language is not None else "",
+                    "amount": amount.text if amount is not None else "",
+                    "price": price.text if price is not None else "",
+                }
+            )
+    return rows
+
+
+def parse_cart(html: str) -> tuple[list[tuple[str, str]], list[dict]]:
+    """
+    The shopping cart page, read from a single snapshot:
+    - The (label, value) texts of the rows (div.d-flex) of the cart overview (.cart-overview).
+    - Every seller section (section.shipment-block), with the data-* attributes of its summary (div.summary) and of
+      the rows of its articles table (table[id^='ArticleTable']):
+        {"seller": name, "summary": {"shipping-price": ..., ...}, "articles": [{"name": ..., "price": ...}, ...]}
+    """
+    root = parse_html(html)
+    overview = []
+    cart_overview = next((x for x in root.iter() if "cart-overview" in x.get("class").split()), None)
+    if cart_overview is not None:
+        for row in cart_overview.find_all("div", lambda x: "d-flex" in x.get("class").split()):
+            spans = row.find_all("span")
+            if len(spans) >= 2:
+                overview.append((spans[0].text, spans[1].text))
+    blocks = []
+    for section in root.find_all("section", lambda x: "shipment-block" in x.get("class").split()):
+        seller_name = next((x for x in section.iter() if "seller-name" in x.get("class").split()), None)
+        seller = seller_name.find("a") if seller_name is not None else None
+        summary = section.find("div", lambda x: "summary" in x.get("class").split())
+        if seller is None or summary is None:
+            continue
+        articles = []
+        table = section.find("table", lambda x: x.get("id").startswith("ArticleTable"))
+        if table is not None:
+            for tbody in table.find_all("tbody"):
+                articles.extend(row.data_attributes() for row in tbody.find_all("tr"))
+        blocks.append({"seller": seller.text, "summary": summary.data_attributes(), "articles": articles})
+    return overview, blocks
+
+
+def parse_shipment_blocks(html: str) -> list[dict[str, str]]:
+    """
+    Seller and data-* attributes of the summary (without the "data-" prefix, e.g. "shipping-price") of every
+    seller section (section.shipment-block) of the shopping cart page.
+    """
+    return [block["summary"] | {"seller": block["seller"]} for block in parse_cart(html)[1]]
+
+
+def parse_result_card(result_card: Element) -> dict:
+    """
+    Seller, summary and articles of a seller of the Shopping Wizard results (.detailed-result-card), with the same
+    elements that shopping_wizard_optimizer.py used to read with find_element:
+        {"seller": name, "summary": [(dt text, dd text), ...],
+         "articles": [{"quantity", "card_name", "expansion", "language", "condition", "price"}, ...]}
+    The expansion, language and condition are the titles of their icons (None if missing), the rest are texts.
+    """
+    seller_name = next((x for x in result_card.iter() if "seller-name" in x.get("class").split()), None)
+    seller = seller_name.find("a") if seller_name is not None else None
+    summary = []
+    dl = result_card.find("dl")
+    if dl is not None:
+        summary = [(dt.text, dd.text) for dt, dd in zip(dl.find_all("dt"), dl.find_all("dd"))]
+    articles = []
+    for table in result_card.find_all("table"):
+        for tbody in table.find_all("tbody"):
+            for row in tbody.find_all("tr"):
+                tds = row.find_all("td")
+                if len(tds) < 9:
+                    continue
+                # Quantity, card name, expansion, language, condition and price are the tds 2, 3, 4, 5, 6 and 8.
+                expansion = next((x for x in tds[4].iter() if "expansion-symbol" in x.get("class").split()), None)
+                language = next((x for x in tds[5].iter() if "icon" in x.get("class").split()), None)
+                condition = next((x for x in tds[6].iter() if "article-condition" in x.get("class").split()), None)
+                articles.append(
+                    {
+                        "quantity": tds[2].text,
+                        "card_name": tds[3].text,
+                        "expansion": expansion.attrs.get("data-bs-original-title") if expansion is not None else None,
+                        "language": language.attrs.get("data-bs-original-title") if language is not None else None,
+                        "condition": condition.attrs.get("data-bs-original-title") if condition is not None else None,
+                        "price": tds[8].text,
+                    }
+                )
+    return {"seller": seller.text if seller is not None else "", "summary": summary, "articles": articles}
+
+
+def parse_wizard_results(html: str) -> tuple[list[tuple[str, str]], list[dict]]:
+    """
+    The (dt text, dd text) pairs of the summary of the Shopping Wizard results page (#ShoppingWizardResult) and the
+    results of every seller (see parse_result_card), read from a single snapshot of the page.
+    """
+    root = parse_html(html)
+    summary = []
+    container = next((x for x in root.iter() if x.get("id") == "ShoppingWizardResult"), None)
+    if container is not None:
+        summary = [(dt.text, dd.text) for dt, dd in zip(container.find_all("dt"), container.find_all("dd"))]
+    result_cards = [x for x in root.iter() if "detailed-result-card" in x.get("class").split()]
+    return summary, [parse_result_card(result_card) for result_card in result_cards]
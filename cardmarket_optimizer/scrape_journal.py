@@ -0,0 +1,122 @@
+import json
+import os
+import time
+from pathlib import Path
+
+# Append-only journal (one JSON object per line) of everything the scraper collects, written as it's collected,
+# so nothing is lost if the scraper or the browser crashes. Record types:
+#   {"type": "seller", "seller": ..., "shipping": ...}                Shipping price measured for a new seller.
+#   {"type": "offer", "card": ..., "edition": ..., "offer": {...}}    Offer collected.
+#   {"type": "edition", "card": ..., "edition": ..., "offers": n}    Edition completed, with n offers.
+#   {"type": "card", "card": ...}                                     Card completed.
+# The offers and sellers are periodically saved to the main database (JSON files or SQLite). The journal is then
+# compacted: only the "edition" and "card" records are kept, so that a resumed run knows what was already done
+# (and, when compacting while other editions are being scraped, the offers of those editions).
+
+
+class JournalState:
+    """Contents of a journal: sellers, offers of the completed editions, and completed editions and cards."""
+
+    def __init__(self):
+        self.sellers: dict[str, float | list[dict[str, int | float]]] = {}
+        self.offers: dict[tuple[str, str], list[dict[str, int | float | str]]] = {}
+        self.editions_done: dict[tuple[str, str], int] = {}
+        self.cards_done: set[str] = set()
+        # Time each edition and card was completed (not kept by the compaction, they are saved by then).
+        self.edition_times: dict[tuple[str, str], float] = {}
+        self.card_times: dict[str, float] = {}
+
+    def completed_offers(self) -> dict[tuple[str, str], list[dict[str, int | float | str]]]:
+        """Offers of the editions that were completed (the offers of incomplete editions are dropped)."""
+        return {key: offers for key, offers in self.offers.items() if key in self.editions_done}
+
+
+class ScrapeJournal:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.fp = None
+
+    def _write(self, record: dict):
+        if self.fp is None:
+            self.fp = self.path.open("a", encoding="utf-8")
+        self.fp.write(json.dumps(record, sort_keys=True) + "\n")
+        # Written to the OS right away, so it survives a crash of the script.
+        self.fp.flush()
+
+    def add_seller(self, seller: str, shipping: float | list[dict[str, int | float]]):
+        self._write({"type": "seller", "seller": seller, "shipping": shipping, "time": time.time()})
+
+    def add_offer(self, card_name: str, edition: str, offer: dict[str, int | float | str]):
+        self._write({"type": "offer", "card": card_name, "edition": edition, "offer": offer})
+
+    def edition_done(self, card_name: str, edition: str, num_offers: int):
+        self._write(
+            {"type": "edition", "card": card_name, "edition": edition, "offers": num_offers, "time": time.time()}
+        )
+
+    def card_done(self, card_name: str):
+        self._write({"type": "card", "card": card_name, "time": time.time()})
+
+    def replay(self) -> JournalState:
+        state = JournalState()
+        if not self.path.is_file():
+            return state
+        with self.path.open("r", encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line cut by a crash.
+                    break
+                if record["type"] == "seller":
+                    state.sellers[record["seller"]] = record["shipping"]
+                elif record["type"] == "offer":
+                    key = (record["card"], record["edition"])
+                    if key in state.editions_done:
+                        # The edition is being scraped again, drop the offers of the previous scrape.
+                        del state.editions_done[key]
+                        state.offers[key] = []
+                    state.offers.setdefault(key, []).append(record["offer"])
+                elif record["type"] == "edition":
+                    state.editions_done[(record["card"], record["edition"])] = record["offers"]
+                    if "time" in record:
+                        state.edition_times[(record["card"], record["edition"])] = record["time"]
+                elif record["type"] == "card":
+                    state.cards_done.add(record["card"])
+                    if "time" in record:
+                        state.card_times[record["card"]] = record["time"]
+        return state
+
+    def compact(self, keep_progress: bool = True, keep_incomplete: bool = False):
+        """
+        Drop the offers and sellers (call it after saving them to the main database).
+        If keep_progress, the completed editions and cards are kept (to resume), else the journal is emptied.
+        If keep_incomplete, the offers of the editions that aren't completed are kept (they aren't saved yet).
+        """
+        state = self.replay() if keep_progress else JournalState()
+        self.close()
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as fp:
+            for (card_name, edition), num_offers in state.editions_done.items():
+                record = {"type": "edition", "card": card_name, "edition": edition, "offers": num_offers}
+                fp.write(json.dumps(record, sort_keys=True) + "\n")
+            for card_name in state.cards_done:
+                fp.write(json.dumps({"type": "card", "card": card_name}, sort_keys=True) + "\n")
+            if keep_incomplete:
+                for (card_name, edition), offers in state.offers.items():
+                    if (card_name, edition) in state.editions_done:
+                        continue
+                    for offer in offers:
+                        record = {"type": "offer", "card": card_name, "edition": edition, "offer": offer}
+                        fp.write(json.dumps(record, sort_keys=True) + "\n")
+        # Replaced at once, so a crash during the compaction leaves either the old or the new journal.
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
@@ -1,19 +1,40 @@
 import argparse
+import contextlib
+import itertools
 import json
+import math
+import queue
 import re
+import shutil
+import tempfile
+import threading
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-
-from common import get_cart_price, handle_alert  # type:ignore[import-not-found]
+from urllib.parse import urlsplit
+
+from card_url_cache import CardUrlCache  # type:ignore[import-not-found]
+from common import (  # type:ignore[import-not-found]
+    cart_wait_metrics,
+    get_cart_price,
+    handle_alert,
+    wait_for_cart_change,
+    watch_cart,
+)
+from driver_factory import TimedFirefox, create_driver  # type:ignore[import-not-found]
+from http_fetcher import HttpFetcher  # type:ignore[import-not-found]
+from page_parser import parse_offer_rows, parse_shipment_blocks  # type:ignore[import-not-found]
+from scrape_journal import JournalState, ScrapeJournal  # type:ignore[import-not-found]
 from scraper_filters import filters  # type:ignore[import-not-found]
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.remote.webdriver import WebDriver
-from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select, WebDriverWait
+from shipping import ShippingTable  # type:ignore[import-not-found]
+from sqlite_store import SqliteStore, get_edition  # type:ignore[import-not-found]
+from telemetry import Telemetry  # type:ignore[import-not-found]
 from wakepy import keep
 
 # CLOSE FIREFOX BEFORE RUNNING THIS SCRIPT
@@ -79,141 +100,485 @@ def parse_args():
         default="offers_database.json",
         help="Path to output offers database file (default offers_database.json).",
     )
+    parser.add_argument(
+        "--database",
+        "-d",
+        default=None,
+        help="Path to SQLite database (see sqlite_store.py). If given, the offers and sellers are saved to it "
+        "after every edition instead of rewriting the JSON files.",
+    )
+    parser.add_argument(
+        "--scrape-times",
+        default="scrape_times.json",
+        help="Path to the file with the time each card and edition was scraped, used when the offers are saved to the "
+        "JSON files (the SQLite database has them) (default scrape_times.json).",
+    )
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        default=None,
+        help="Skip the cards and editions scraped less than this many hours ago (default none, scrape everything).",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=None,
+        help="Scrape the cards in order of their last scrape (never scraped first, then the stalest), and don't start "
+        "new cards after this many minutes (default none).",
+    )
+    parser.add_argument(
+        "--top-offers",
+        type=int,
+        default=20,
+        help="Number of cheapest offers of a card that matter (default 20). The editions of a card are visited in order "
+        "of how many of these offers they had in the previous scrapes (editions not scraped before go after the ones "
+        "that had some).",
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Skip the offers (and editions) that can't be among the --top-offers cheapest offers of the card found "
+        "so far: their price plus the cheapest shipping price of any seller isn't lower.",
+    )
+    parser.add_argument(
+        "--url-cache",
+        default="card_url_cache.json",
+        help="Path to the cache of the editions (and their product urls) of each card, so that the search form is only "
+        "used for new cards (default card_url_cache.json).",
+    )
+    parser.add_argument(
+        "--url-cache-ttl",
+        type=float,
+        default=7,
+        help="Days the editions of a card are cached before searching them again (default 7, 0 to always search).",
+    )
+    parser.add_argument(
+        "--telemetry-dir",
+        default="telemetry",
+        help="Directory where the timing report of the run is saved (default telemetry).",
+    )
+    parser.add_argument(
+        "--journal",
+        "-j",
+        default="scrape_journal.jsonl",
+        help="Path to the journal file, where offers and sellers are written as they are collected, so they aren't "
+        "lost if the scraper crashes. They are recovered in the next run (default scrape_journal.jsonl).",
+    )
+    parser.add_argument(
+        "--resume",
+        "-r",
+        action="store_true",
+        help="Skip the cards and editions that were already completed according to the journal.",
+    )
+    parser.add_argument(
+        "--compact-every",
+        type=int,
+        default=10,
+        help="Save the databases and compact the journal every N cards (default 10).",
+    )
+    parser.add_argument("--headless", action="store_true", help="Run Firefox without a window.")
+    parser.add_argument(
+        "--full-browser",
+        action="store_true",
+        help="Load images, media, fonts and other sites' resources (by default they are blocked to load pages faster).",
+    )
+    parser.add_argument(
+        "--base-url",
+        default="https://www.cardmarket.com",
+        help="Address of the site (default https://www.cardmarket.com), e.g. the one of fixture_server.py to run "
+        "against recorded pages. Use another database, journal and url cache with it.",
+    )
+    parser.add_argument(
+        "--record-dir",
+        default=None,
+        help="Directory where the visited pages are saved, to replay them with fixture_server.py (default none).",
+    )
+    parser.add_argument(
+        "--batch-shipping",
+        action="store_true",
+        help="Measure the shipping price of the new sellers of an edition page all at once: put one article of each "
+        "one in the cart and read their shipping prices from the shopping cart page, instead of waiting for the cart "
+        "price to change after every article.",
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=1,
+        help="Number of browsers scraping cards in parallel, each one logged in with its own copy of the browser "
+        "profile (default 1). Keep it low (e.g. 2-3) to not overload Cardmarket. Implies --batch-shipping.",
+    )
+    parser.add_argument(
+        "--fetch",
+        choices=["browser", "http"],
+        default="browser",
+        help="How the card pages are loaded (default browser). With 'http', they are fetched as plain HTML with the "
+        "cookies of the logged in browser (much faster), and only loaded in the browser when it's needed (new "
+        "sellers, whose shipping price is measured with the cart, or a failed fetch).",
+    )
+    parser.add_argument(
+        "--throttle",
+        type=float,
+        default=1.0,
+        help="Min seconds between the page loads of each worker (default 1.0).",
+    )
 
     args = parser.parse_args()
     return args
 
 
-def empty_cart(driver: WebDriver, ret=True):
+def empty_cart(driver: TimedFirefox, ret=True):
     # Empty cart
-    driver.get("https://www.cardmarket.com/en/Magic/ShoppingCart")
-    remove_btn = WebDriverWait(driver, 10).until(
-        EC.element_to_be_clickable((By.XPATH, "//input[@value='Remove all articles']"))
-    )
-    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", remove_btn)
-    driver.execute_script("arguments[0].click();", remove_btn)
-    # Wait for confirmation that cart is empty
-    try:
-        WebDriverWait(driver, 10).until_not(
-            EC.presence_of_element_located((By.XPATH, "//input[@value='Remove all articles']"))
+    with telemetry.span("empty cart"):
+        driver.get(f"{args.base_url}/en/Magic/ShoppingCart")
+        remove_btn = WebDriverWait(driver, 10).until(
+            EC.element_to_be_clickable((By.XPATH, "//input[@value='Remove all articles']"))
         )
-    except TimeoutException:
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", remove_btn)
+        driver.execute_script("arguments[0].click();", remove_btn)
+        # Wait for confirmation that cart is empty
+        try:
+            WebDriverWait(driver, 10).until_not(
+                EC.presence_of_element_located((By.XPATH, "//input[@value='Remove all articles']"))
+            )
+            emptied = True
+        except TimeoutException:
+            emptied = False
+    if not emptied:
         return empty_cart(driver, ret)
+    driver.record_page("empty-cart")
     if ret:
         driver.back()
 
 
-def get_row_data(row: WebElement, sellers_database: dict[str, float]):
-    try:
-        button = row.find_element(By.XPATH, ".//button[@aria-label='Put in shopping cart']")
-    except NoSuchElementException:
-        return None, None
+def load_scrape_times(path: str | Path) -> tuple[dict[str, float], dict[tuple[str, str], float]]:
+    """Time each card and each (card, edition) was last scraped, from the scrape times file (JSON mode)."""
+    if not Path(path).is_file():
+        return {}, {}
+    with Path(path).open("r", encoding="utf-8") as fp:
+        scrape_times = json.load(fp)
+    edition_times = {
+        (card_name, edition): scraped_at
+        for card_name, editions in scrape_times["editions"].items()
+        for edition, scraped_at in editions.items()
+    }
+    return scrape_times["cards"], edition_times
+
+
+def save_databases(
+    args,
+    store: SqliteStore | None,
+    offers_database: dict[str, list[dict[str, int | float | str]]],
+    sellers_database: dict[str, float | list[dict[str, int | float]]],
+    saved_sellers: set[str],
+    card_times: dict[str, float],
+    edition_times: dict[tuple[str, str], float],
+):
+    if store is not None:
+        # The offers and scrape times are saved to the SQLite database after every edition and card, only the new
+        # sellers are left.
+        store.upsert_sellers({seller: sellers_database[seller] for seller in set(sellers_database) - saved_sellers})
+        saved_sellers.update(sellers_database)
+    else:
+        with Path(args.offers_database).open("w") as fp:
+            json.dump(offers_database, fp, indent=2, sort_keys=True)
+        with Path(args.sellers_database).open("w") as fp:
+            json.dump(sellers_database, fp, indent=2, sort_keys=True)
+        editions: dict[str, dict[str, float]] = {}
+        for (card_name, edition), scraped_at in edition_times.items():
+            editions.setdefault(card_name, {})[edition] = scraped_at
+        with Path(args.scrape_times).open("w") as fp:
+            json.dump({"cards": card_times, "editions": editions}, fp, indent=2, sort_keys=True)
 
-    # Get the seller name
-    seller_element = row.find_element(
-        By.XPATH, ".//div[contains(@class,'col-sellerProductInfo')]//span[contains(@class,'seller-name')]//a"
-    )
-    seller_name = seller_element.text.strip()
-    # Get the condition
-    condition_element = row.find_element(
-        By.XPATH,
-        ".//div[contains(@class,'col-product')]//div[contains(@class,'product-attributes')]/a[contains(@class,'article-condition')]/span",
-    )
-    condition = condition_element.text.strip()
-    # Get the language
-    language_element = row.find_element(
-        By.XPATH,
-        ".//div[contains(@class,'col-product')]//div[contains(@class,'product-attributes')]/span[@aria-label]",
-    )
-    language = str(language_element.get_attribute("aria-label")).strip()
-    # Get the amount
-    amount_element = row.find_element(
-        By.XPATH,
-        ".//div[contains(@class,'col-offer')]//div[contains(@class,'amount-container')]//span",
-    )
-    amount = int(amount_element.text.strip())
-    # Get the price
-    card_element = row.find_element(
-        By.XPATH,
-        ".//div[contains(@class,'col-offer')]//div[contains(@class,'price-container')]//span[contains(text(),'€')]",
-    )
-    price = float(card_element.text.strip().replace("€", "").replace(".", "").replace(",", "."))
 
-    clicked = False
-    if seller_name not in sellers_database:
-        # Get current cart price before clicking
-        cart_price_before = get_cart_price(driver)
-        # Click "Put in shopping cart"
-        driver.execute_script("arguments[0].scrollIntoView(true);", button)
-        WebDriverWait(driver, 10).until(EC.element_to_be_clickable(button))
-        driver.execute_script("arguments[0].click();", button)
-        clicked = True
-        alert_result = handle_alert(driver)
-        # Wait for cart price to change
-        cart_price_after = cart_price_before
-        while cart_price_before == cart_price_after and alert_result:
-            # Get new total cart price
-            try:
-                cart_price_after = get_cart_price(driver)
-            except StaleElementReferenceException:
-                continue
-            time.sleep(0.1)
-        if (cart_price_before == cart_price_after) or (alert_result is not None and not alert_result):
-            return None, clicked
-        # Calculate total an shipping prices
-        total_price = cart_price_after - cart_price_before
-        shipping_price = total_price - price
-        sellers_database[seller_name] = round(shipping_price, 2)
-    else:
-        shipping_price = sellers_database[seller_name]
-        total_price = price + shipping_price
+def is_fresh(scraped_at: float | None) -> bool:
+    """If it was scraped less than --max-age hours ago."""
+    return args.max_age is not None and scraped_at is not None and time.time() - scraped_at < args.max_age * 3600
 
-    return {
-        "total_price": round(total_price, 2),
-        "price": round(price, 2),
-        "shipping_price": round(shipping_price, 2),
-        "amount": amount,
-        "seller": seller_name,
-        "condition": condition,
-        "language": language,
-    }, clicked
 
+def count_edition_offers(card_name: str, edition: str) -> int:
+    if store is not None:
+        return store.count_offers(card_name, edition)
+    return sum(1 for offer in offers_database.get(card_name, []) if get_edition(offer) == edition)
 
-with keep.presenting():
-    args = parse_args()
 
-    sellers_database: dict[str, float] = {}
-    if Path(args.sellers_database).is_file():
-        sellers_database = json.load(Path(args.sellers_database).open("r", encoding="utf-8"))
+def rank_editions(card_name: str, urls: list[str]) -> list[str]:
+    """
+    Edition urls of the card sorted by how many of its --top-offers cheapest offers each edition had in the previous
+    scrapes (the offers in the database). Editions not scraped before go after the ones that had some of them, and
+    before the ones that had none. Ties keep the order of the search results.
+    """
+    with db_lock:
+        if store is not None:
+            past_offers = store.get_offers([card_name]).get(card_name, [])
+        else:
+            past_offers = list(offers_database.get(card_name, []))
+        scraped_editions = {edition for card, edition in edition_times if card == card_name}
+    past_offers.sort(key=lambda x: float(x["total_price"]))
+    top_offers_per_edition = Counter(get_edition(offer) for offer in past_offers[: args.top_offers])
+    scraped_editions.update(get_edition(offer) for offer in past_offers)
 
-    offers_database: dict[str, list[dict[str, int | float | str]]] = {}
-    if Path(args.offers_database).is_file():
-        offers_database = json.load(Path(args.offers_database).open("r", encoding="utf-8"))
+    def score(url: str) -> float:
+        edition = get_edition({"url": url})
+        return top_offers_per_edition[edition] if edition in scraped_editions else 0.5
 
-    card_list: dict[str, int] = {}
-    with Path(args.card_list).open("r", encoding="utf-8") as fp:
-        for line in fp:
-            pattern = re.compile(r"\s+")
-            line = pattern.sub(" ", line).strip()
-            card_name = line
-            amount = 1
-            parts = line.split(" ", maxsplit=1)
-            if len(parts) == 2:
-                if parts[0].isdigit():
-                    card_name = parts[1]
-                    amount = int(parts[0])
-            if len(card_name) > 0:
-                card_name = re.sub(r"(.*?[^/]) *//? *([^/].*)", r"\1 // \2", card_name).lower()
-                card_list[card_name] = card_list.get(card_name, 0) + amount
+    return sorted(urls, key=lambda x: -score(x))
+
+
+def prune_rows(rows: list[dict[str, str | bool]], price_bound: float) -> list[dict[str, str | bool]]:
+    """
+    Rows with a price below the bound. The rows are sorted by price (price_asc), so they are cut at the first one
+    that isn't.
+    """
+    for row_idx, row in enumerate(rows):
+        if row["has_cart_button"] and row_price(row) >= price_bound:
+            return rows[:row_idx]
+    return rows
 
-    options = Options()
+
+def uniquify_offers(offers: list[dict[str, int | float | str]]) -> list[dict[str, int | float | str]]:
+    return list(dict(offer) for offer in set(frozenset(offer.items()) for offer in offers))
+
+
+def row_price(row: dict[str, str | bool]) -> float:
+    return float(str(row["price"]).replace("€", "").replace(".", "").replace(",", "."))
+
+
+def row_offer(row: dict[str, str | bool], shipping_price: float) -> dict[str, int | float | str]:
+    price = row_price(row)
+    return {
+        "total_price": round(price + shipping_price, 2),
+        "price": round(price, 2),
+        "shipping_price": round(shipping_price, 2),
+        "amount": int(str(row["amount"])),
+        "seller": str(row["seller"]),
+        "condition": str(row["condition"]),
+        "language": str(row["language"]),
+    }
+
+
+def get_filters_string() -> str:
+    """Query string of the offers filters of scraper_filters.py (e.g. "sellerCountry=7&language=1,3")."""
+    filter_strings = []
+    for name, value in filters.items():
+        filter_string = name + "="
+        if isinstance(value, list):
+            if len(value) > 0:
+                filter_string += ",".join(str(i) for i in value)
+                filter_strings.append(filter_string)
+        elif value is not None:
+            filter_string += str(value)
+            filter_strings.append(filter_string)
+    return "&".join(filter_strings)
+
+
+def put_row_in_cart(driver: WebDriver, row: dict[str, str | bool]) -> bool | None:
+    """Click the "Put in shopping cart" button of the row. Returns the result of handle_alert."""
+    row_element = driver.find_element(By.ID, str(row["id"]))
+    button = row_element.find_element(By.XPATH, ".//button[@aria-label='Put in shopping cart']")
+    driver.execute_script("arguments[0].scrollIntoView(true);", button)
+    WebDriverWait(driver, 10).until(EC.element_to_be_clickable(button))
+    driver.execute_script("arguments[0].click();", button)
+    return handle_alert(driver)
+
+
+def get_row_data(
+    driver: WebDriver,
+    row: dict[str, str | bool],
+    sellers_database: dict[str, float | list[dict[str, int | float]]],
+):
+    """
+    Offer of a row of the offers table, parsed from the page source (see page_parser.parse_offer_rows).
+    The shipping price of unknown sellers is measured by putting the offer in the shopping cart.
+    """
+    if not row["has_cart_button"]:
+        return None, None
+
+    seller_name = str(row["seller"])
+    price = row_price(row)
+
+    clicked = False
+    if seller_name not in sellers_database:
+        with telemetry.span("shipping probe"):
+            # Get current cart price before clicking
+            cart_price_before = get_cart_price(driver)
+            watch_cart(driver)
+            # Click "Put in shopping cart"
+            alert_result = put_row_in_cart(driver, row)
+            clicked = True
+            # Wait for cart price to change
+            cart_price_after = cart_price_before
+            if alert_result:
+                cart_price_after = wait_for_cart_change(driver, cart_price_before)
+        if (cart_price_before == cart_price_after) or (alert_result is not None and not alert_result):
+            return None, clicked
+        # Calculate shipping price
+        shipping_price = cart_price_after - cart_price_before - price
+        with db_lock:
+            sellers_database[seller_name] = round(shipping_price, 2)
+    else:
+        # The shipping price of one article (sellers with tiered shipping have a table of prices).
+        shipping_price = ShippingTable(sellers_database[seller_name]).base_price
+
+    return row_offer(row, shipping_price), clicked
+
+
+def get_cart_shipping_prices(driver: WebDriver) -> dict[str, float]:
+    """Shipping price of every seller in the cart, read from a single load of the shopping cart page."""
+    with telemetry.span("cart page"):
+        driver.get(f"{args.base_url}/en/Magic/ShoppingCart")
+        try:
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, "section.shipment-block")))
+        except TimeoutException:
+            return {}
+        blocks = parse_shipment_blocks(driver.page_source)
+    return {block["seller"]: float(block["shipping-price"]) for block in blocks}
+
+
+def first_offer_rows(rows: list[dict[str, str | bool]], limit: int) -> list[dict[str, str | bool]]:
+    return [row for row in rows if row["has_cart_button"]][:limit]
+
+
+def fetch_offer_rows(
+    fetcher: HttpFetcher,
+    url: str,
+    sellers_database: dict[str, float | list[dict[str, int | float]]],
+    limit: int,
+    price_bound: float = math.inf,
+) -> list[dict[str, str | bool]] | None:
+    """
+    Rows of the offers table of the page fetched over HTTP (with a price below price_bound), or None if the page has
+    to be loaded in the browser: the fetch failed, or there are new sellers (their shipping price is measured with
+    the cart, which needs JS).
+    """
+    html = fetcher.get(url, required_text='class="table-body"')
+    if html is None:
+        return None
+    with telemetry.span("row parse"):
+        rows = prune_rows(parse_offer_rows(html), price_bound)
+    if any(str(row["seller"]) not in sellers_database for row in first_offer_rows(rows, limit)):
+        return None
+    return rows
+
+
+def get_offers_batched(
+    driver: TimedFirefox,
+    rows: list[dict[str, str | bool]],
+    sellers_database: dict[str, float | list[dict[str, int | float]]],
+    limit: int,
+) -> list[dict[str, int | float | str]]:
+    """
+    Offers of the rows of an edition page (up to limit), measuring the shipping price of all its unknown sellers
+    at once: one article of each one is put in the cart (without waiting for the cart price to change), then the
+    shipping prices are read from the shopping cart page and the cart is emptied.
+    """
+    offers = []
+    pending_rows = []
+    sellers_in_cart = set()
+    # Whether an article may be in the cart, even if no alert confirmed it.
+    cart_used = False
+    unknown_sellers = any(str(row["seller"]) not in sellers_database for row in first_offer_rows(rows, limit))
+    # The cart is shared by the sessions of all the workers (same account), only one worker uses it at a time.
+    # A seller is only unknown if no worker measured it before, so it's never measured twice.
+    with cart_lock if unknown_sellers else contextlib.nullcontext():
+        for row in rows:
+            if len(offers) + len(pending_rows) >= limit:
+                break
+            if not row["has_cart_button"]:
+                continue
+            seller_name = str(row["seller"])
+            if seller_name in sellers_database:
+                offers.append(row_offer(row, ShippingTable(sellers_database[seller_name]).base_price))
+                continue
+            if seller_name not in sellers_in_cart:
+                with telemetry.span("shipping probe"):
+                    alert_result = put_row_in_cart(driver, row)
+                cart_used = True
+                if not alert_result:
+                    # Error adding to cart, another offer of the seller may work.
+                    continue
+                sellers_in_cart.add(seller_name)
+            pending_rows.append(row)
+
+        if cart_used:
+            # The cart is read even if no alert confirmed the articles, since they may be in it anyway (and would be
+            # measured with the next edition if it wasn't emptied).
+            shipping_prices = get_cart_shipping_prices(driver)
+            with db_lock:
+                for seller_name in sellers_in_cart:
+                    if seller_name in shipping_prices:
+                        sellers_database[seller_name] = round(shipping_prices[seller_name], 2)
+                        journal.add_seller(seller_name, sellers_database[seller_name])
+            for row in pending_rows:
+                # The offers of sellers missing from the cart page are dropped.
+                if str(row["seller"]) in shipping_prices:
+                    offers.append(row_offer(row, shipping_prices[str(row["seller"])]))
+            if shipping_prices:
+                empty_cart(driver, ret=False)
+    return offers
+
+
+def add_offer(
+    offers: set,
+    offer: dict[str, int | float | str],
+    url: str,
+    card_name: str,
+    edition_name: str,
+):
+    offer["url"] = url.split("?", maxsplit=1)[0]
+    frozen_offer = frozenset(offer.items())
+    if frozen_offer not in offers:
+        tmp_dict = dict(frozen_offer)
+        tmp_dict.pop("url")
+        print(dict(sorted(tmp_dict.items())))
+        with db_lock:
+            journal.add_offer(card_name, edition_name, offer)
+        telemetry.count("offers")
+    offers.add(frozen_offer)
+
+
+class Throttle:
+    """Waits so that the pages loaded by a worker are at least interval seconds apart."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last = 0.0
+
+    def wait(self):
+        delay = self.last + self.interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.last = time.monotonic()
+
+
+def start_driver(worker: int) -> tuple[TimedFirefox, str | None]:
+    """Browser of the worker, and the copy of the Firefox profile it uses (if any), to be deleted at the end."""
+    profile = args.browser_profile
+    profile_copy = None
     if args.browser_profile:
-        options.add_argument("-profile")
-        options.add_argument(args.browser_profile)
-    driver = webdriver.Firefox(options=options)
+        if args.workers > 1:
+            # A profile can only be used by one Firefox at a time, so each worker uses a copy (with its own cookies).
+            profile_copy = tempfile.mkdtemp(prefix=f"scraper_profile_{worker}_")
+            shutil.copytree(
+                args.browser_profile,
+                profile_copy,
+                dirs_exist_ok=True,
+                ignore=shutil.ignore_patterns("lock", ".parentlock", "parent.lock"),
+            )
+            profile = profile_copy
+    driver = create_driver(
+        profile,
+        headless=args.headless,
+        lean=not args.full_browser,
+        allowed_hosts=["cardmarket.com", "cloudflare.com", str(urlsplit(args.base_url).hostname)],
+        record_dir=args.record_dir,
+    )
+    return driver, profile_copy
+
 
+def log_in(driver: TimedFirefox):
     # --- Step 0: Accept cookies and log in ---
-    driver.get("https://www.cardmarket.com/en/Magic")
+    driver.get(f"{args.base_url}/en/Magic")
 
     try:
         accept_button = WebDriverWait(driver, 2).until(
@@ -238,167 +603,385 @@ with keep.presenting():
     account_dropdown = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "account-dropdown")))
     logged_in_username = account_dropdown.find_element(By.XPATH, ".//span[@class='d-none d-lg-block']").text
     print(f"Login successful! Logged in as: {logged_in_username}")
+    driver.record_page("logged-in")
 
-    if get_cart_price(driver) != 0:
-        empty_cart(driver, ret=False)
 
-    for card_num, card_name in enumerate(card_list, start=1):
-        # --- Step 1: Search for card ---
-        print(f"\nProcessing card {card_num}/{len(card_list)} '{card_name}'")
-        driver.get("https://www.cardmarket.com/en/Magic/Products/Singles")
+def search_card_editions(driver: TimedFirefox, throttle: Throttle, card_name: str) -> list[tuple[str, str, str]]:
+    """Editions of the card (edition, rarity, product url), from the search form of the Singles page."""
+    # --- Step 1: Search for card ---
+    throttle.wait()
+    driver.get(f"{args.base_url}/en/Magic/Products/Singles")
 
-        search_box = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable(
-                (By.XPATH, "//label[normalize-space(text())='Name']/following-sibling::input[@name='searchString']")
-            )
+    search_box = WebDriverWait(driver, 10).until(
+        EC.element_to_be_clickable(
+            (By.XPATH, "//label[normalize-space(text())='Name']/following-sibling::input[@name='searchString']")
         )
-        search_box.clear()
-        search_box.send_keys(card_name)
+    )
+    search_box.clear()
+    search_box.send_keys(card_name)
 
-        checkbox = WebDriverWait(driver, 1).until(EC.element_to_be_clickable((By.XPATH, "//input[@name='exactMatch']")))
-        if not checkbox.is_selected():
-            checkbox.click()
+    checkbox = WebDriverWait(driver, 1).until(EC.element_to_be_clickable((By.XPATH, "//input[@name='exactMatch']")))
+    if not checkbox.is_selected():
+        checkbox.click()
 
-        checkbox = WebDriverWait(driver, 1).until(
-            EC.element_to_be_clickable((By.XPATH, "//input[@name='onlyAvailable']"))
-        )
-        if not checkbox.is_selected():
-            checkbox.click()
+    checkbox = WebDriverWait(driver, 1).until(EC.element_to_be_clickable((By.XPATH, "//input[@name='onlyAvailable']")))
+    if not checkbox.is_selected():
+        checkbox.click()
 
-        dropdown_element = WebDriverWait(driver, 1).until(
-            EC.element_to_be_clickable((By.XPATH, "//select[@name='sortBy']"))
-        )
-        select = Select(dropdown_element)
-        select.select_by_value("price_asc")
+    dropdown_element = WebDriverWait(driver, 1).until(
+        EC.element_to_be_clickable((By.XPATH, "//select[@name='sortBy']"))
+    )
+    select = Select(dropdown_element)
+    select.select_by_value("price_asc")
 
-        search_button = WebDriverWait(driver, 1).until(
-            EC.element_to_be_clickable((By.XPATH, "//input[@type='submit' and @value='Search']"))
-        )
-        search_button.click()
+    search_button = WebDriverWait(driver, 1).until(
+        EC.element_to_be_clickable((By.XPATH, "//input[@type='submit' and @value='Search']"))
+    )
+    search_button.click()
 
-        # --- Step 2: Collect card urls ---
-        excluded_rarities = {"Special", "Token", "Code Card", "Tip Card"}
+    # --- Step 2: Collect card urls ---
+    rows = WebDriverWait(driver, 1).until(
+        EC.presence_of_all_elements_located((By.XPATH, "//div[@class='table-body']/div[contains(@id,'productRow')]"))
+    )
+    # The search results are reached by submitting the form, not with get.
+    driver.record_page()
+
+    editions = []
 
-        rows = WebDriverWait(driver, 1).until(
-            EC.presence_of_all_elements_located(
-                (By.XPATH, "//div[@class='table-body']/div[contains(@id,'productRow')]")
+    for row in rows:
+        try:
+            # Extract rarity (from the SVG's aria-label)
+            rarity_element = row.find_element(
+                By.XPATH, ".//div[contains(@class,'col-sm-2')]/div/span/*[name()='svg' and @aria-label]"
             )
-        )
+            rarity = str(rarity_element.get_attribute("aria-label")).strip()
+
+            # Extract name and link
+            name_element = row.find_element(By.XPATH, ".//div[contains(@class,'col')]/div/div/div/a")
+            url = str(name_element.get_attribute("href")).strip()
+            url = url.split("?", maxsplit=1)[0]  # Remove any filters, if any.
+            editions.append((get_edition({"url": url}), rarity, url))
+        except Exception as e:
+            print(e)
+
+    return editions
+
+
+def scrape_card(driver: TimedFirefox, fetcher: HttpFetcher | None, throttle: Throttle, card_name: str):
+    with db_lock:
+        editions = url_cache.get(card_name)
+    if editions is None:
+        with telemetry.span("search"):
+            editions = search_card_editions(driver, throttle, card_name)
+        if editions:
+            with db_lock:
+                url_cache.set(card_name, editions)
+                url_cache.save()
+    else:
+        print("Editions found in the url cache.")
 
-        card_urls = []
+    # Skip unwanted rarities
+    excluded_rarities = {"Special", "Token", "Code Card", "Tip Card"}
+    card_urls = [url for _, rarity, url in editions if rarity not in excluded_rarities]
 
-        for row in rows:
-            try:
-                # Extract rarity (from the SVG's aria-label)
-                rarity_element = row.find_element(
-                    By.XPATH, ".//div[contains(@class,'col-sm-2')]/div/span/*[name()='svg' and @aria-label]"
-                )
-                rarity = str(rarity_element.get_attribute("aria-label")).strip()
-                # Skip unwanted rarities
-                if rarity in excluded_rarities:
-                    continue
+    # Add filters to card urls
+    card_urls_with_filters: list[str] = []
+    for card_url in card_urls:
+        if len(filters_string) > 0:
+            card_url += "?" + filters_string
+        card_urls_with_filters.append(card_url)
 
-                # Extract name and link
-                name_element = row.find_element(By.XPATH, ".//div[contains(@class,'col')]/div/div/div/a")
-                url = str(name_element.get_attribute("href")).strip()
-                url = url.split("?", maxsplit=1)[0]  # Remove any filters, if any.
-                card_urls.append(url)
-            except Exception as e:
-                print(e)
-
-        # Add filters to card urls
-        card_urls_with_filters: list[str] = []
-        for card_url in card_urls:
-            filter_strings = []
-            for name, value in filters.items():
-                filter_string = name + "="
-                if isinstance(value, list):
-                    if len(value) > 0:
-                        filter_string += ",".join(str(i) for i in value)
-                        filter_strings.append(filter_string)
-                elif value is not None:
-                    filter_string += str(value)
-                    filter_strings.append(filter_string)
-            all_filters_string = "&".join(filter_strings)
-            if len(all_filters_string) > 0:
-                card_url += "?" + all_filters_string
-            card_urls_with_filters.append(card_url)
-
-        # --- Step 3: Visit each card page to get all the offers ---
+    # --- Step 3: Visit each card page to get all the offers ---
+    with db_lock:
         if card_name not in offers_database:
             offers_database[card_name] = []
-        editions_limit = min(args.max_editions, len(card_urls_with_filters))
-        per_edition_limit = max(args.min_offers_per_edition, (args.max_total_offers // editions_limit))
-        # print(f"DEBUG: {editions_limit=} {per_edition_limit=}")
-        total_amount_offers = 0
-        for edition_idx, url in enumerate(card_urls_with_filters):
-            url_parts = url.split("?", maxsplit=1)[0].split("/")
-            edition_name = url_parts[-2]
-            print(f"Processing edition {edition_idx + 1}/{len(card_urls_with_filters)} '{edition_name}'")
-
-            driver.get(url)
-
-            # Get the details of all the offers
-            offers: set = set()
-            i = 0
-            refresh_rows = True
-            disappeared_rows = 0
-            while len(offers) < per_edition_limit:
-                # Find all rows inside the offers table
-                if refresh_rows:
-                    table = WebDriverWait(driver, 10).until(
-                        EC.presence_of_element_located((By.XPATH, "//section[@id='table']"))
-                    )
-                    rows = table.find_elements(By.XPATH, "//div[@class='table-body']/div[contains(@id, 'articleRow')]")
-
-                # Collect offer
-                try:
-                    row = rows[i]
-                except IndexError:
-                    break
-                offer, clicked = get_row_data(row, sellers_database)
-                if offer is None and clicked:
-                    # Error adding to cart, try again.
-                    refresh_rows = True
-                    empty_cart(driver)
-                    i += disappeared_rows
-                    disappeared_rows = 0
-                    continue
-                if (offer is not None and clicked is not None) and (clicked and offer["amount"] == 1):
-                    # Row disappeared.
-                    # Rows disappear when "Put in shopping cart" is clicked and when amount in offer == 1.
-                    disappeared_rows += 1
-                    refresh_rows = True
-                else:
-                    i += 1
-                    refresh_rows = False
-                if offer is None:
-                    continue
-                offer["url"] = url.split("?", maxsplit=1)[0]
-                offer = frozenset(offer.items())
-                if offer not in offers:
-                    tmp_dict = dict(offer)
-                    tmp_dict.pop("url")
-                    print(dict(sorted(tmp_dict.items())))
-                offers.add(offer)
+    editions_limit = min(args.max_editions, len(card_urls_with_filters))
+    per_edition_limit = max(args.min_offers_per_edition, (args.max_total_offers // editions_limit))
+    # print(f"DEBUG: {editions_limit=} {per_edition_limit=}")
+    card_urls_with_filters = rank_editions(card_name, card_urls_with_filters)
+    # Total prices of the offers of the card found so far, for the pruning.
+    card_total_prices: list[float] = []
+    total_amount_offers = 0
+    for edition_idx, url in enumerate(card_urls_with_filters):
+        url_parts = url.split("?", maxsplit=1)[0].split("/")
+        edition_name = url_parts[-2]
+        print(f"Processing edition {edition_idx + 1}/{len(card_urls_with_filters)} '{edition_name}'")
+        if (card_name, edition_name) in journal_state.editions_done:
+            print("Already scraped, skipping.")
+            total_amount_offers += journal_state.editions_done[(card_name, edition_name)]
+            if edition_idx + 1 >= args.max_editions or total_amount_offers >= args.max_total_offers:
+                break
+            continue
+        if is_fresh(edition_times.get((card_name, edition_name))):
+            print("Scraped recently, skipping.")
+            with db_lock:
+                total_amount_offers += count_edition_offers(card_name, edition_name)
+            if edition_idx + 1 >= args.max_editions or total_amount_offers >= args.max_total_offers:
+                break
+            continue
+        edition_amount_offers = total_amount_offers
+
+        # PRUNING: An offer costs at least its price plus the cheapest shipping price of any seller. If that isn't
+        #          lower than the --top-offers-th cheapest total price found so far, the offer can't be among the
+        #          top offers, and neither can the rest of the edition's offers (sorted by price).
+        price_bound = math.inf
+        if args.prune and len(card_total_prices) >= args.top_offers:
+            with db_lock:
+                min_shipping_price = min(
+                    (ShippingTable(shipping).base_price for shipping in sellers_database.values()), default=0.0
+                )
+            price_bound = sorted(card_total_prices)[args.top_offers - 1] - min_shipping_price
+
+        throttle.wait()
+        rows = None
+        if fetcher is not None:
+            with telemetry.span("edition fetch"):
+                rows = fetch_offer_rows(fetcher, url, sellers_database, per_edition_limit, price_bound)
+        if rows is None:
+            with telemetry.span("edition load"):
+                driver.get(url)
+            if fetcher is not None:
+                fetcher.update_cookies(driver)
+
+        # Get the details of all the offers
+        offers: set = set()
+        offers_collected = rows is not None or args.batch_shipping
+        if offers_collected:
+            if rows is None:
+                WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, "//section[@id='table']")))
+                with telemetry.span("row parse"):
+                    rows = prune_rows(parse_offer_rows(driver.page_source), price_bound)
+            for offer in get_offers_batched(driver, rows, sellers_database, per_edition_limit):
+                add_offer(offers, offer, url, card_name, edition_name)
+                card_total_prices.append(float(offer["total_price"]))
                 total_amount_offers += 1
+        i = 0
+        refresh_rows = True
+        disappeared_rows = 0
+        while not offers_collected and len(offers) < per_edition_limit:
+            # Find all rows inside the offers table
+            if refresh_rows:
+                WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, "//section[@id='table']")))
+                # All the rows are read from a single snapshot of the page.
+                with telemetry.span("row parse"):
+                    rows = prune_rows(parse_offer_rows(driver.page_source), price_bound)
+
+            # Collect offer
+            try:
+                row = rows[i]
+            except IndexError:
+                break
+            offer, clicked = get_row_data(driver, row, sellers_database)
+            if offer is not None and clicked:
+                # New seller, its shipping price was just measured.
+                with db_lock:
+                    journal.add_seller(str(offer["seller"]), sellers_database[str(offer["seller"])])
+            if offer is None and clicked:
+                # Error adding to cart, try again.
+                refresh_rows = True
+                empty_cart(driver)
+                i += disappeared_rows
+                disappeared_rows = 0
+                continue
+            if (offer is not None and clicked is not None) and (clicked and offer["amount"] == 1):
+                # Row disappeared.
+                # Rows disappear when "Put in shopping cart" is clicked and when amount in offer == 1.
+                disappeared_rows += 1
+                refresh_rows = True
+            else:
+                i += 1
+                refresh_rows = False
+            if offer is None:
+                continue
+            add_offer(offers, offer, url, card_name, edition_name)
+            card_total_prices.append(float(offer["total_price"]))
+            total_amount_offers += 1
+
+        with db_lock:
+            # This edition's offers replace the ones of the previous scrape.
+            offers_database[card_name] = [
+                offer for offer in offers_database[card_name] if get_edition(offer) != edition_name
+            ] + [dict(offer) for offer in offers]
+            if store is not None:
+                # Only this edition's offers are written.
+                store.replace_offers(card_name, edition_name, [dict(offer) for offer in offers])
+            edition_times[(card_name, edition_name)] = time.time()
+            journal.edition_done(card_name, edition_name, total_amount_offers - edition_amount_offers)
+        telemetry.count("editions")
+
+        # Stop if we reach the limit.
+        if edition_idx + 1 >= args.max_editions or total_amount_offers >= args.max_total_offers:
+            break
+
+    with db_lock:
+        # Uniquify offers.
+        offers_database[card_name] = uniquify_offers(offers_database[card_name])
+        card_times[card_name] = time.time()
+        if store is not None:
+            store.mark_card_scraped(card_name, card_times[card_name])
+        journal.card_done(card_name)
 
-            if len(offers) > 0:
-                offers_database[card_name].extend(dict(offer) for offer in offers)
 
-            # Stop if we reach the limit.
-            if edition_idx + 1 >= args.max_editions or total_amount_offers >= args.max_total_offers:
+def run_worker(worker: int, cards: queue.Queue):
+    """Scrape the cards of the queue (shared by all the workers) in a browser of its own."""
+    driver, profile_copy = start_driver(worker)
+    fetcher = None
+    try:
+        with telemetry.span("login"):
+            log_in(driver)
+        if args.fetch == "http":
+            fetcher = HttpFetcher(driver)
+        with cart_lock:
+            if get_cart_price(driver) != 0:
+                empty_cart(driver, ret=False)
+        throttle = Throttle(args.throttle)
+
+        while True:
+            if deadline is not None and time.monotonic() > deadline:
+                print("Time budget used up, the rest of the cards are left for the next run.")
+                break
+            try:
+                card_num, card_name = cards.get_nowait()
+            except queue.Empty:
                 break
+            worker_string = f" (worker {worker + 1})" if args.workers > 1 else ""
+            print(f"\nProcessing card {card_num}/{len(card_names)} '{card_name}'{worker_string}")
+            if card_name in journal_state.cards_done:
+                print("Already scraped, skipping.")
+                continue
 
-        # Uniquify offers.
-        offers_database[card_name] = list(
-            dict(offer) for offer in set(frozenset(offer.items()) for offer in offers_database[card_name])
-        )
+            with telemetry.span("card"):
+                scrape_card(driver, fetcher, throttle, card_name)
+            telemetry.count("cards")
+
+            # The journal has everything collected since the last save, so the databases are only saved every few
+            # cards. The offers of the editions being scraped by other workers are kept in the journal.
+            with db_lock:
+                if next(scraped_cards) % args.compact_every == 0:
+                    with telemetry.span("save"):
+                        save_databases(
+                            args, store, offers_database, sellers_database, saved_sellers, card_times, edition_times
+                        )
+                        journal.compact(keep_incomplete=True)
+
+            with cart_lock:
+                if get_cart_price(driver) != 0:
+                    empty_cart(driver, ret=False)
+    finally:
+        worker_string = f" (worker {worker + 1})" if args.workers > 1 else ""
+        print(f"Page load times{worker_string}: {driver.page_load_report()}")
+        if fetcher is not None:
+            fetcher.close()
+        driver.close()
+        if profile_copy is not None:
+            shutil.rmtree(profile_copy, ignore_errors=True)
 
-        json.dump(offers_database, Path(args.offers_database).open("w"), indent=2, sort_keys=True)
-        json.dump(sellers_database, Path(args.sellers_database).open("w"), indent=2, sort_keys=True)
 
-        if get_cart_price(driver) != 0:
-            empty_cart(driver, ret=False)
+with keep.presenting():
+    args = parse_args()
+    telemetry = Telemetry("scraper")
+    if args.workers > 1 and not args.batch_shipping:
+        # The cart price measurement of one seller at a time doesn't work with other workers changing the cart.
+        print("Using --batch-shipping, required by --workers > 1.")
+        args.batch_shipping = True
+
+    store = SqliteStore(args.database) if args.database is not None else None
+
+    sellers_database: dict[str, float | list[dict[str, int | float]]] = {}
+    if store is not None:
+        sellers_database = store.get_sellers()
+    elif Path(args.sellers_database).is_file():
+        with Path(args.sellers_database).open("r", encoding="utf-8") as fp:
+            sellers_database = json.load(fp)
+    # Sellers already saved to the database.
+    saved_sellers = set(sellers_database)
+
+    offers_database: dict[str, list[dict[str, int | float | str]]] = {}
+    if store is None and Path(args.offers_database).is_file():
+        with Path(args.offers_database).open("r", encoding="utf-8") as fp:
+            offers_database = json.load(fp)
+
+    if store is not None:
+        card_times, edition_times = store.get_scrape_times()
+    else:
+        card_times, edition_times = load_scrape_times(args.scrape_times)
+
+    # Recover the offers and sellers collected by a previous run that didn't finish.
+    journal = ScrapeJournal(args.journal)
+    journal_state = journal.replay()
+    if journal_state.sellers or journal_state.offers:
+        print(f"Recovering {len(journal_state.completed_offers())} editions from the journal.")
+    sellers_database.update(journal_state.sellers)
+    for (card_name, edition_name), edition_offers in journal_state.completed_offers().items():
+        edition_times[(card_name, edition_name)] = journal_state.edition_times.get(
+            (card_name, edition_name), time.time()
+        )
+        if store is not None:
+            store.replace_offers(card_name, edition_name, edition_offers, edition_times[(card_name, edition_name)])
+        else:
+            offers_database[card_name] = uniquify_offers(
+                [offer for offer in offers_database.get(card_name, []) if get_edition(offer) != edition_name]
+                + edition_offers
+            )
+    for card_name, scraped_at in journal_state.card_times.items():
+        card_times[card_name] = scraped_at
+        if store is not None:
+            store.mark_card_scraped(card_name, scraped_at)
+    save_databases(args, store, offers_database, sellers_database, saved_sellers, card_times, edition_times)
+    journal.compact(keep_progress=args.resume)
+    if not args.resume:
+        journal_state = JournalState()
+
+    card_list: dict[str, int] = {}
+    with Path(args.card_list).open("r", encoding="utf-8") as fp:
+        for line in fp:
+            pattern = re.compile(r"\s+")
+            line = pattern.sub(" ", line).strip()
+            card_name = line
+            amount = 1
+            parts = line.split(" ", maxsplit=1)
+            if len(parts) == 2:
+                if parts[0].isdigit():
+                    card_name = parts[1]
+                    amount = int(parts[0])
+            if len(card_name) > 0:
+                card_name = re.sub(r"(.*?[^/]) *//? *([^/].*)", r"\1 // \2", card_name).lower()
+                card_list[card_name] = card_list.get(card_name, 0) + amount
 
-    driver.close()
+    # The workers share the databases, the journal and the shopping cart (the same account is logged in every
+    # browser), each one used by one worker at a time. Locks are always taken in the order cart_lock, db_lock.
+    db_lock = threading.Lock()
+    cart_lock = threading.Lock()
+    scraped_cards = itertools.count(1)
+    url_cache = CardUrlCache(args.url_cache, args.url_cache_ttl * 24 * 3600)
+    filters_string = get_filters_string()
+    card_names = list(card_list)
+    if args.max_age is not None:
+        fresh_cards = {card_name for card_name in card_names if is_fresh(card_times.get(card_name))}
+        if fresh_cards:
+            print(f"Skipping {len(fresh_cards)} cards scraped less than {args.max_age} hours ago.")
+        card_names = [card_name for card_name in card_names if card_name not in fresh_cards]
+    deadline = None
+    if args.time_budget is not None:
+        # Stalest first, so that the cards that aren't reached in time are the ones scraped most recently.
+        card_names.sort(key=lambda x: card_times.get(x, 0.0))
+        deadline = time.monotonic() + args.time_budget * 60
+    cards: queue.Queue = queue.Queue()
+    for card_num, card_name in enumerate(card_names, start=1):
+        cards.put((card_num, card_name))
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(run_worker, worker, cards) for worker in range(args.workers)]
+        for future in futures:
+            # Raises the exception of a worker that failed.
+            future.result()
+
+    save_databases(args, store, offers_database, sellers_database, saved_sellers, card_times, edition_times)
+    print(f"Add to cart waits: {cart_wait_metrics.report()}")
+    print(telemetry.summary())
+    print(f"Timing report saved to {telemetry.write_report(args.telemetry_dir)}")
+    # Everything was saved, the next run starts from scratch.
+    journal.remove()
+
+    if store is not None:
+        store.close()
@@ -0,0 +1,100 @@
+# SHIPPING: The sellers database maps each seller to its shipping price. The price can be a single number
+#           (the same price for any order) or a table of tiers, since the shipping method (and price) changes
+#           with the number of articles and their value (e.g. letter vs. tracked letter vs. parcel):
+#             "seller1": 1.15
+#             "seller2": [
+#               {"max_articles": 4, "max_value": 25.0, "price": 1.15},
+#               {"max_articles": 17, "max_value": 100.0, "price": 2.9},
+#               {"price": 6.5}
+#             ]
+#           "max_articles" and "max_value" are optional (no limit). An order pays the cheapest tier that allows
+#           its number of articles and value, or the most expensive tier if none allows it.
+
+
+class ShippingTable:
+    """Shipping price of a seller depending on the number of articles and their total value."""
+
+    def __init__(self, entry: float | list[dict[str, int | float]]):
+        if isinstance(entry, (int, float)):
+            entry = [{"price": entry}]
+        self.tiers: list[tuple[float, int | float, float]] = sorted(
+            (
+                float(tier["price"]),
+                tier.get("max_articles", float("inf")),
+                float(tier.get("max_value", float("inf"))),
+            )
+            for tier in entry
+        )
+        self.tiered = len(self.tiers) > 1
+
+    @property
+    def base_price(self) -> float:
+        """Cheapest price of the table (the price of a single cheap article)."""
+        return self.tiers[0][0]
+
+    def price(self, articles: int, value: float) -> float:
+        if articles <= 0:
+            return 0.0
+        for price, max_articles, max_value in self.tiers:
+            # Small tolerance for the rounding errors of the values added and removed.
+            if articles <= max_articles and value <= max_value + 1e-9:
+                return price
+        return self.tiers[-1][0]
+
+
+def get_shipping_tables(
+    sellers_database: dict[str, float | list[dict[str, int | float]]],
+    offers_database: dict[str, list[dict[str, int | float | str]]],
+    card_names,
+) -> dict[str, ShippingTable]:
+    """Shipping table of every seller of the cards. Sellers not in the database use the offer's shipping price."""
+    shipping_tables: dict[str, ShippingTable] = {}
+    for card_name in card_names:
+        if card_name not in offers_database:
+            continue
+        for offer in offers_database[card_name]:
+            seller = str(offer["seller"])
+            if seller not in shipping_tables:
+                shipping_tables[seller] = ShippingTable(sellers_database.get(seller, float(offer["shipping_price"])))
+    return shipping_tables
+
+
+class ShippingTracker:
+    """
+    Articles, value and shipping price of each seller of a solution. Updating a seller when articles are added
+    or removed, and calculating how much its shipping price would change, only looks at that seller's table.
+    """
+
+    def __init__(self, shipping_tables: dict[str, ShippingTable]):
+        self.shipping_tables = shipping_tables
+        self.articles: dict[str, int] = {}
+        self.values: dict[str, float] = {}
+        self.prices: dict[str, float] = {}
+
+    def price(self, seller: str) -> float:
+        """Current shipping price of the seller."""
+        return self.prices.get(seller, 0.0)
+
+    def delta(self, seller: str, articles: int, value: float) -> float:
+        """Change of the seller's shipping price if the articles are added (negative amounts to remove them)."""
+        new_price = self.shipping_tables[seller].price(
+            self.articles.get(seller, 0) + articles, self.values.get(seller, 0.0) + value
+        )
+        return new_price - self.prices.get(seller, 0.0)
+
+    def add(self, seller: str, articles: int, value: float) -> float:
+        """Add the articles (negative amounts to remove them). Returns the change of the seller's shipping price."""
+        old_price = self.prices.get(seller, 0.0)
+        self.articles[seller] = self.articles.get(seller, 0) + articles
+        self.values[seller] = self.values.get(seller, 0.0) + value
+        if self.articles[seller] == 0:
+            del self.articles[seller]
+            del self.values[seller]
+            del self.prices[seller]
+            return -old_price
+        self.prices[seller] = self.shipping_tables[seller].price(self.articles[seller], self.values[seller])
+        return self.prices[seller] - old_price
+
+    @property
+    def total(self) -> float:
+        return sum(self.prices.values())
@@ -23,22 +23,30 @@ import argparse
 import re
 import time
 from pprint import pprint
-
-from common import get_cart_price, handle_alert, parse_number  # type:ignore[import-not-found]
-from selenium import webdriver
+from urllib.parse import urlsplit
+
+from common import (  # type:ignore[import-not-found]
+    cart_wait_metrics,
+    get_cart_price,
+    handle_alert,
+    parse_number,
+    wait_for_cart_change,
+    watch_cart,
+)
+from driver_factory import create_driver  # type:ignore[import-not-found]
+from page_parser import parse_cart, parse_wizard_results  # type:ignore[import-not-found]
 from selenium.common.exceptions import (
     ElementClickInterceptedException,
     ElementNotInteractableException,
-    StaleElementReferenceException,
     TimeoutException,
 )
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
-from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select, WebDriverWait
 from shopping_wizard_optimizer_filter import filters  # type:ignore[import-not-found]
+from telemetry import Telemetry  # type:ignore[import-not-found]
 
 DEBUG = True
 
@@ -70,11 +78,44 @@ def parse_args():
         help="Path to Firefox profile. E.g. "
         r"C:\Users\<user>\AppData\Roaming\Firefox\Profiles\<random_string>.default-release",
     )
+    parser.add_argument("--headless", action="store_true", help="Run Firefox without a window.")
+    parser.add_argument(
+        "--full-browser",
+        action="store_true",
+        help="Load images, media, fonts and other sites' resources (by default they are blocked to load pages faster).",
+    )
+    parser.add_argument(
+        "--base-url",
+        default="https://www.cardmarket.com",
+        help="Address of the site (default https://www.cardmarket.com), e.g. the one of fixture_server.py to run "
+        "against recorded pages.",
+    )
+    parser.add_argument(
+        "--record-dir",
+        default=None,
+        help="Directory where the visited pages are saved, to replay them with fixture_server.py (default none).",
+    )
+    parser.add_argument(
+        "--telemetry-dir",
+        default="telemetry",
+        help="Directory where the timing report of the run is saved (default telemetry).",
+    )
 
     args = parser.parse_args()
     return args
 
 
+def parse_summary(texts: list[tuple[str, str]]) -> dict[str, int | float]:
+    """Summary of the Shopping Wizard results from its (dt, dd) texts, e.g. {"shipping-cost": 2.5, ...}."""
+    summary: dict[str, int | float] = {}
+    for dt, dd in texts:
+        key = dt.strip().lower().replace(" ", "-")
+        if not key:
+            continue
+        summary[key] = parse_number(dd.strip())
+    return summary
+
+
 def add_seller_to_cart(driver: WebDriver, seller_name: str):
     seller_result_cards = driver.find_elements(By.CSS_SELECTOR, ".detailed-result-card")
     for result_card in seller_result_cards:
@@ -89,6 +130,7 @@ def add_seller_to_cart(driver: WebDriver, seller_name: str):
         button = form.find_element(By.CSS_SELECTOR, "button[type='submit']")
         # Get current cart price before clicking.
         cart_price_before = get_cart_price(driver)
+        watch_cart(driver)
         # Click "Put in shopping cart".
         driver.execute_script("arguments[0].scrollIntoView({'block':'center'});", button)
         while True:
@@ -98,29 +140,26 @@ def add_seller_to_cart(driver: WebDriver, seller_name: str):
             except ElementClickInterceptedException:
                 time.sleep(0.5)
         # Wait for cart price to change.
-        cart_price_after = cart_price_before
-        while cart_price_before == cart_price_after:
-            # Get new total cart price.
-            try:
-                cart_price_after = get_cart_price(driver)
-            except StaleElementReferenceException:
-                continue
-            time.sleep(0.1)
+        if wait_for_cart_change(driver, cart_price_before) == cart_price_before:
+            print(f"Warning: The cart didn't change after adding the articles of {seller_name}.")
         handle_alert(driver)
         break  # Break after finding the seller.
 
 
 args = parse_args()
-
-
-options = Options()
-if args.browser_profile:
-    options.add_argument("-profile")
-    options.add_argument(args.browser_profile)
-driver = webdriver.Firefox(options=options)
+telemetry = Telemetry("shopping_wizard_optimizer")
+
+driver = create_driver(
+    args.browser_profile,
+    headless=args.headless,
+    lean=not args.full_browser,
+    allowed_hosts=["cardmarket.com", "cloudflare.com", str(urlsplit(args.base_url).hostname)],
+    record_dir=args.record_dir,
+)
 
 # --- Step 0: Accept cookies and log in ---
-driver.get("https://www.cardmarket.com/en/Magic")
+span = telemetry.span("login")
+driver.get(f"{args.base_url}/en/Magic")
 
 try:
     accept_button = WebDriverWait(driver, 2).until(
@@ -145,6 +184,8 @@ login_button.click()
 account_dropdown = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "account-dropdown")))
 logged_in_username = account_dropdown.find_element(By.XPATH, ".//span[@class='d-none d-lg-block']").text
 print(f"Login successful! Logged in as: {logged_in_username}")
+driver.record_page("logged-in")
+span.end()
 
 # --- Optimizer: Run the Shopping Wizard iteratively ---
 
@@ -247,8 +288,10 @@ cart_has_items = True
 iteration_num = 0
 while cart_has_items:
     print(f"\n=== Iteration {iteration_num + 1} ===")
+    telemetry.count("iterations")
     # --- Step 1: Go to Shopping Wizard for the Wants List ---
-    driver.get(f"https://www.cardmarket.com/en/Magic/Wants/ShoppingWizard?idWantsList={args.wants_list_id}")
+    span = telemetry.span("wizard load")
+    driver.get(f"{args.base_url}/en/Magic/Wants/ShoppingWizard?idWantsList={args.wants_list_id}")
 
     done = False
     while not done:
@@ -269,8 +312,10 @@ while cart_has_items:
             done = True
         except ElementClickInterceptedException:
             print("Warning: Error while clicking the 'Next' button. Trying again.")
+    span.end()
 
     # --- Step 2: Select filters ---
+    span = telemetry.span("filters")
     select_options_section = WebDriverWait(driver, 10).until(
         EC.visibility_of_element_located(
             (By.XPATH, "//section[h2[text()='Select Your Options'] and not(contains(@style, 'display: none'))]")
@@ -334,8 +379,10 @@ while cart_has_items:
     )
     driver.execute_script("arguments[0].scrollIntoView(true);", next_button)
     next_button.click()
+    span.end()
 
     # --- Step 3: Choose strategy and run ---
+    span = telemetry.span("wizard run")
     strategy_section = WebDriverWait(driver, 10).until(
         EC.visibility_of_element_located(
             (
@@ -369,73 +416,44 @@ while cart_has_items:
     WebDriverWait(driver, 300).until(
         lambda d: d.current_url if "/Wants/ShoppingWizard/Results/" in d.current_url else False
     )
+    span.end()
 
     # --- Step 5: Extract information ---
+    span = telemetry.span("results parse")
     # --- Step 5a: Get the Shopping Wizard Results Summary ---
-    summary_container = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "ShoppingWizardResult")))
-    dt_elems = summary_container.find_elements(By.TAG_NAME, "dt")
-    dd_elems = summary_container.find_elements(By.TAG_NAME, "dd")
-    overall_summary: dict[str, int | float] = {}
-    for dt, dd in zip(dt_elems, dd_elems):
-        key = dt.text.strip().lower().replace(" ", "-")
-        if not key:
-            continue
-        val = parse_number(dd.text.strip())
-        overall_summary[key] = val
+    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "ShoppingWizardResult")))
+    # The results page is reached by running the wizard, not with get.
+    driver.record_page()
+    # All the results are read from a single snapshot of the page (see page_parser.parse_wizard_results).
+    overall_summary_texts, seller_results = parse_wizard_results(driver.page_source)
+    overall_summary = parse_summary(overall_summary_texts)
     results_overall_summaries.append(overall_summary)
 
     # --- Step 5b: Per seller: extract summaries and details (articles list) ---
     summaries_per_seller: dict[str, dict[str, int | float]] = {}
     details_per_seller: dict[str, list[dict[str, int | float | str | None]]] = {}
 
-    seller_result_cards = driver.find_elements(By.CSS_SELECTOR, ".detailed-result-card")
-
-    for result_card in seller_result_cards:
-        seller_anchor = result_card.find_element(By.CSS_SELECTOR, ".seller-name a")
-        seller_name = seller_anchor.text.strip()
-
-        # Extract the summary for this seller.
-        summary: dict[str, int | float] = {}
-        dl = result_card.find_element(By.TAG_NAME, "dl")
-        dt_elems = dl.find_elements(By.TAG_NAME, "dt")
-        dd_elems = dl.find_elements(By.TAG_NAME, "dd")
-        for dt, dd in zip(dt_elems, dd_elems):
-            key = dt.text.strip().lower().replace(" ", "-")
-            if not key:
-                continue
-            val = parse_number(dd.text.strip())
-            summary[key] = val
-        summaries_per_seller[seller_name] = summary
+    for seller_result in seller_results:
+        seller_name = seller_result["seller"]
+        summaries_per_seller[seller_name] = parse_summary(seller_result["summary"])
 
         # Extract the details (articles list) for this seller.
         details: list[dict[str, int | float | str | None]] = []
-        rows = result_card.find_elements(By.CSS_SELECTOR, "table tbody tr")
-        for row in rows:
-            article_details: dict[str, int | float | str | None] = {}
-            tds = row.find_elements(By.TAG_NAME, "td")
-            # Quantity is in the 3rd td (index 2).
-            qty_elem = tds[2]
-            article_details["quantity"] = parse_number(qty_elem.text)
-            # Card name is in the 4th td (index 3).
-            card_name_elem = tds[3]
-            article_details["card_name"] = re.sub(r"\s*\(V\.\d+\)$", "", card_name_elem.text)
-            # Expansion is in the 5th td (index 4).
-            exp_elem = tds[4].find_element(By.CSS_SELECTOR, ".expansion-symbol")
-            article_details["expansion"] = exp_elem.get_attribute("data-bs-original-title")
-            # Language is in the 6th td (index 5).
-            lang_elem = tds[5].find_element(By.CSS_SELECTOR, ".icon")
-            article_details["language"] = lang_elem.get_attribute("data-bs-original-title")
-            # Condition is in the 7th td (index 6).
-            cond_elem = tds[6].find_element(By.CSS_SELECTOR, ".article-condition")
-            article_details["condition"] = cond_elem.get_attribute("data-bs-original-title")
-            # Price is in the 9th td (index 8).
-            price_elem = tds[8]
-            article_details["price"] = parse_number(price_elem.text)
+        for article in seller_result["articles"]:
+            article_details: dict[str, int | float | str | None] = {
+                "quantity": parse_number(article["quantity"]),
+                "card_name": re.sub(r"\s*\(V\.\d+\)$", "", article["card_name"]),
+                "expansion": article["expansion"],
+                "language": article["language"],
+                "condition": article["condition"],
+                "price": parse_number(article["price"]),
+            }
             details.append(article_details)
         details_per_seller[seller_name] = details
 
     results_summaries_per_seller.append(summaries_per_seller)
     results_details_per_seller.append(details_per_seller)
+    span.end()
 
     # --- Step 6: Add to cart sellers with good value ---
     cards_added_to_cart: dict[str, int] = {}
@@ -471,7 +489,8 @@ while cart_has_items:
                 print(
                     f"Adding {len(results_details_per_seller[iteration_num][seller_name])} articles to cart from seller '{seller_name}'. Used strategy {strategy}."
                 )
-                add_seller_to_cart(driver, seller_name)
+                with telemetry.span("add to cart"):
+                    add_seller_to_cart(driver, seller_name)
                 for article in results_details_per_seller[iteration_num][seller_name]:
                     assert isinstance(article["quantity"], int)
                     cards_added_to_cart[str(article["card_name"])] = cards_added_to_cart.get(
@@ -489,7 +508,8 @@ while cart_has_items:
         pprint(cards_added_to_cart)
 
     # --- Step 7: Remove cards added to cart from Wants List ---
-    driver.get(f"https://www.cardmarket.com/en/Magic/Wants/{args.wants_list_id}")
+    span = telemetry.span("wants list update")
+    driver.get(f"{args.base_url}/en/Magic/Wants/{args.wants_list_id}")
 
     WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "WantsListTable")))
 
@@ -546,6 +566,7 @@ while cart_has_items:
         )
     )
     if len(new_wants_list) == 0:
+        span.end()
         break
     # Click the Add Deck List button.
     button = WebDriverWait(driver, 10).until(
@@ -574,16 +595,20 @@ while cart_has_items:
         )
     except TimeoutException:
         print("Warning: No success alert after adding new wants list.")
+    span.end()
 
     iteration_num += 1
 
 # --- Step 8: Show a comparison of the prices before and after the optimizer ---
-driver.get("https://www.cardmarket.com/en/Magic/ShoppingCart")
+span = telemetry.span("cart parse")
+driver.get(f"{args.base_url}/en/Magic/ShoppingCart")
+
+WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, ".cart-overview")))
+WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, "section.shipment-block")))
+# The whole cart is read from a single snapshot of the page (see page_parser.parse_cart).
+cart_overview, shipment_blocks = parse_cart(driver.page_source)
 
 # 1) shopping_cart_overall_summary: parse the cart overview.
-cart_overview_elem = WebDriverWait(driver, 10).until(
-    EC.presence_of_element_located((By.CSS_SELECTOR, ".cart-overview"))
-)
 shopping_cart_overall_summary = {}
 label_map_overall_summary = {
     "Number of orders": "shipments",
@@ -593,12 +618,8 @@ label_map_overall_summary = {
     "Trustee Service": "trustee-service",
     "Total": "total",
 }
-# Find all d-flex rows inside the cart overview and pick values by label
-rows = cart_overview_elem.find_elements(By.CSS_SELECTOR, "div.d-flex")
-for row in rows:
-    spans = row.find_elements(By.TAG_NAME, "span")
-    label_text = spans[0].text.strip()
-    value_text = spans[1].text.strip()
+# Pick the values of the rows of the cart overview by label.
+for label_text, value_text in cart_overview:
     mapped_key = label_map_overall_summary.get(label_text)
     if mapped_key is not None:
         shopping_cart_overall_summary[mapped_key] = parse_number(value_text)
@@ -606,80 +627,61 @@ if DEBUG:
     print(f"DEBUG: {shopping_cart_overall_summary}=")
 
 # 2) shopping_cart_summaries_per_seller and 3) shopping_cart_details_per_seller: parse each seller section.
-WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, "section.shipment-block")))
-seller_sections = driver.find_elements(By.CSS_SELECTOR, "section.shipment-block")
-for section in seller_sections:
-    seller_anchor = section.find_element(By.CSS_SELECTOR, ".seller-name a")
-    seller_name = seller_anchor.text.strip()
+language_map = {
+    "1": "English",
+    "2": "French",
+    "3": "German",
+    "4": "Spanish",
+    "5": "Italian",
+    "6": "S-Chinese",
+    "7": "Japanese",
+    "8": "Portuguese",
+    "9": "Russian",
+    "10": "Korean",
+    "11": "T-Chinese",
+}
+# Convert condition number to string.
+condition_map = {
+    "1": "Mint",
+    "2": "Near Mint",
+    "3": "Excellent",
+    "4": "Good",
+    "5": "Light Played",
+    "6": "Played",
+    "7": "Poor",
+}
+for block in shipment_blocks:
+    seller_name = block["seller"]
     if DEBUG:
         print(f"DEBUG: {seller_name=}")
-    # 2) Parse seller summary.
-    data_attrs = section.find_element(By.CSS_SELECTOR, "div.summary").get_attribute("outerHTML")
-    assert data_attrs is not None
-    data_article_count = re.sub(r'.*data-article-count="([\d\.]+)".*', r"\1", data_attrs)
-    data_item_value = re.sub(r'.*data-item-value="([\d\.]+)".*', r"\1", data_attrs)
-    data_total_price = re.sub(r'.*data-total-price="([\d\.]+)".*', r"\1", data_attrs)
-    data_shipping_price = re.sub(r'.*data-shipping-price="([\d\.]+)".*', r"\1", data_attrs)
-    data_internal_insurance = re.sub(r'.*data-internal-insurance="([\d\.]+)".*', r"\1", data_attrs)
-    data_vat_payment = re.sub(r'.*data-vat-payment="([\d\.]+)".*', r"\1", data_attrs)
-    shopping_cart_summaries_per_seller[seller_name] = {}
-    shopping_cart_summaries_per_seller[seller_name]["wanted-articles"] = int(data_article_count)
-    shopping_cart_summaries_per_seller[seller_name]["articles-value"] = float(data_item_value)
-    shopping_cart_summaries_per_seller[seller_name]["total"] = float(data_total_price)
-    shopping_cart_summaries_per_seller[seller_name]["shipping-cost"] = float(data_shipping_price)
-    shopping_cart_summaries_per_seller[seller_name]["trustee-service"] = float(data_internal_insurance)
-    shopping_cart_summaries_per_seller[seller_name]["vat-payment"] = float(data_vat_payment)
+    # 2) Parse seller summary (the data-* attributes of its div.summary).
+    data_attrs = block["summary"]
+    shopping_cart_summaries_per_seller[seller_name] = {
+        "wanted-articles": int(data_attrs["article-count"]),
+        "articles-value": float(data_attrs["item-value"]),
+        "total": float(data_attrs["total-price"]),
+        "shipping-cost": float(data_attrs["shipping-price"]),
+        "trustee-service": float(data_attrs["internal-insurance"]),
+        "vat-payment": float(data_attrs["vat-payment"]),
+    }
     if DEBUG:
         print(f"DEBUG: {shopping_cart_summaries_per_seller[seller_name]=}")
 
-    # 3) Parse seller details (articles list).
-    table = section.find_element(By.CSS_SELECTOR, "table[id^='ArticleTable']")
-    rows = table.find_elements(By.CSS_SELECTOR, "tbody tr")
-    for row in rows:
-        data_attrs = row.get_attribute("outerHTML")
-        assert data_attrs is not None
-        data_amount = re.sub(r'.*data-amount="([^"]+)".*', r"\1", data_attrs)
-        data_name = re.sub(r'.*data-name="([^"]+)".*', r"\1", data_attrs)
-        data_expansion_name = re.sub(r'.*data-expansion-name="([^"]+)".*', r"\1", data_attrs)
-        data_price = re.sub(r'.*data-price="([\d\.]+)".*', r"\1", data_attrs)
-        data_language = re.sub(r'.*data-language="([^"]+)".*', r"\1", data_attrs)
-        data_condition = re.sub(r'.*data-condition="([^"]+)".*', r"\1", data_attrs)
-        language_map = {
-            "1": "English",
-            "2": "French",
-            "3": "German",
-            "4": "Spanish",
-            "5": "Italian",
-            "6": "S-Chinese",
-            "7": "Japanese",
-            "8": "Portuguese",
-            "9": "Russian",
-            "10": "Korean",
-            "11": "T-Chinese",
-        }
-        data_language_str = language_map.get(data_language, "Unknown")
-        # Convert condition number to string.
-        condition_map = {
-            "1": "Mint",
-            "2": "Near Mint",
-            "3": "Excellent",
-            "4": "Good",
-            "5": "Light Played",
-            "6": "Played",
-            "7": "Poor",
-        }
-        data_condition_str = condition_map.get(data_condition, "Unknown")
+    # 3) Parse seller details (the data-* attributes of the rows of its articles table).
+    for data_attrs in block["articles"]:
         article_details = {
-            "card-name": data_name,
-            "quantity": int(data_amount),
-            "expansion": data_expansion_name,
-            "language": data_language_str,
-            "condition": data_condition_str,
-            "price": float(data_price),
+            "card-name": data_attrs["name"],
+            "quantity": int(data_attrs["amount"]),
+            "expansion": data_attrs["expansion-name"],
+            "language": language_map.get(data_attrs.get("language", ""), "Unknown"),
+            "condition": condition_map.get(data_attrs.get("condition", ""), "Unknown"),
+            "price": float(data_attrs["price"]),
         }
         shopping_cart_details_per_seller.setdefault(seller_name, []).append(article_details)
     if DEBUG:
-        print(f"DEBUG: {shopping_cart_details_per_seller[seller_name]=}")
+        print(f"DEBUG: {shopping_cart_details_per_seller.get(seller_name)=}")
+
+span.end()
 
 # Print shopping cart summaries.
 print("\n--- Shopping cart overall summary ---")
@@ -718,3 +720,7 @@ if len(results_overall_summaries) > 0:
         print(f"{key}: original={orig_val} final={final_val} diff={diff}")
 else:
     print("No original Shopping Wizard summary (results_overall_summaries is empty).")
+print(f"Page load times: {driver.page_load_report()}")
+print(f"Add to cart waits: {cart_wait_metrics.report()}")
+print(telemetry.summary())
+print(f"Timing report saved to {telemetry.write_report(args.telemetry_dir)}")
@@ -0,0 +1,193 @@
+import argparse
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+# SQLite database with the offers and sellers, shared by scraper.py and optimizer.py.
+# Each offer is stored with its card, edition and seller (indexed), so the scraper only writes the offers of the
+# edition it just scraped and the optimizer only reads the cards of its card list.
+# The offers are stored as JSON, the same dicts as in offers_database.json, and the sellers' shipping price
+# as in sellers_database.json (a number or a table of tiers, see shipping.py).
+# Every card, edition and seller has the time it was scraped (a card's time is when all its editions were done).
+#
+# Convert from / to the JSON files:
+#   python sqlite_store.py import --database cardmarket.sqlite -o offers_database.json -s sellers_database.json
+#   python sqlite_store.py export --database cardmarket.sqlite -o offers_database.json -s sellers_database.json
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sellers (
+    seller TEXT PRIMARY KEY,
+    shipping TEXT NOT NULL,
+    scraped_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cards (
+    card TEXT PRIMARY KEY,
+    scraped_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS editions (
+    card TEXT NOT NULL,
+    edition TEXT NOT NULL,
+    scraped_at REAL NOT NULL,
+    PRIMARY KEY (card, edition)
+);
+CREATE TABLE IF NOT EXISTS offers (
+    card TEXT NOT NULL,
+    edition TEXT NOT NULL,
+    seller TEXT NOT NULL,
+    offer TEXT NOT NULL,
+    scraped_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS offers_card_edition_seller ON offers (card, edition, seller);
+"""
+
+
+def get_edition(offer: dict[str, int | float | str]) -> str:
+    """Edition of the offer, from its product url (.../Products/Singles/<edition>/<card>)."""
+    url = str(offer.get("url", ""))
+    url_parts = url.split("?", maxsplit=1)[0].split("/")
+    return url_parts[-2] if len(url_parts) >= 2 else ""
+
+
+class SqliteStore:
+    def __init__(self, path: str | Path):
+        # Usable from several threads (e.g. the scraper workers), as long as they don't use it at the same time.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def replace_offers(
+        self,
+        card_name: str,
+        edition: str,
+        offers: list[dict[str, int | float | str]],
+        scraped_at: float | None = None,
+    ):
+        """Replace the offers of the card's edition with the ones just scraped."""
+        scraped_at = time.time() if scraped_at is None else scraped_at
+        with self.connection:
+            self.connection.execute("DELETE FROM offers WHERE card = ? AND edition = ?", (card_name, edition))
+            self.connection.executemany(
+                "INSERT INTO offers (card, edition, seller, offer, scraped_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (card_name, edition, str(offer["seller"]), json.dumps(offer, sort_keys=True), scraped_at)
+                    for offer in offers
+                ],
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO editions (card, edition, scraped_at) VALUES (?, ?, ?)",
+                (card_name, edition, scraped_at),
+            )
+
+    def mark_card_scraped(self, card_name: str, scraped_at: float | None = None):
+        scraped_at = time.time() if scraped_at is None else scraped_at
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO cards (card, scraped_at) VALUES (?, ?)", (card_name, scraped_at)
+            )
+
+    def get_scrape_times(self) -> tuple[dict[str, float], dict[tuple[str, str], float]]:
+        """Time each card and each (card, edition) was last scraped."""
+        card_times = dict(self.connection.execute("SELECT card, scraped_at FROM cards").fetchall())
+        edition_times = {
+            (card_name, edition): scraped_at
+            for card_name, edition, scraped_at in self.connection.execute(
+                "SELECT card, edition, scraped_at FROM editions"
+            )
+        }
+        return card_times, edition_times
+
+    def count_offers(self, card_name: str, edition: str) -> int:
+        row = self.connection.execute(
+            "SELECT COUNT(*) FROM offers WHERE card = ? AND edition = ?", (card_name, edition)
+        ).fetchone()
+        return row[0]
+
+    def upsert_sellers(
+        self,
+        sellers_database: dict[str, float | list[dict[str, int | float]]],
+        scraped_at: float | None = None,
+    ):
+        scraped_at = time.time() if scraped_at is None else scraped_at
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO sellers (seller, shipping, scraped_at) VALUES (?, ?, ?)",
+                [(seller, json.dumps(shipping), scraped_at) for seller, shipping in sellers_database.items()],
+            )
+
+    def get_offers(self, card_names=None) -> dict[str, list[dict[str, int | float | str]]]:
+        """Offers of the given cards (or of all cards), in the same format as offers_database.json."""
+        offers_database: dict[str, list[dict[str, int | float | str]]] = {}
+        if card_names is None:
+            rows = self.connection.execute("SELECT card, offer FROM offers ORDER BY rowid")
+            for card_name, offer in rows:
+                offers_database.setdefault(card_name, []).append(json.loads(offer))
+            return offers_database
+        for card_name in card_names:
+            rows = self.connection.execute("SELECT offer FROM offers WHERE card = ? ORDER BY rowid", (card_name,))
+            offers = [json.loads(offer) for (offer,) in rows]
+            if offers:
+                offers_database[card_name] = offers
+        return offers_database
+
+    def get_sellers(self) -> dict[str, float | list[dict[str, int | float]]]:
+        """Shipping price of every seller, in the same format as sellers_database.json."""
+        rows = self.connection.execute("SELECT seller, shipping FROM sellers")
+        return {seller: json.loads(shipping) for seller, shipping in rows}
+
+    def import_json(self, offers_database_path: str | Path, sellers_database_path: str | Path):
+        """Add the offers and sellers of the JSON files. The editions in the files replace the stored ones."""
+        scraped_at = time.time()
+        if Path(sellers_database_path).is_file():
+            with Path(sellers_database_path).open("r", encoding="utf-8") as fp:
+                self.upsert_sellers(json.load(fp), scraped_at)
+        if Path(offers_database_path).is_file():
+            with Path(offers_database_path).open("r", encoding="utf-8") as fp:
+                offers_database = json.load(fp)
+            for card_name, offers in offers_database.items():
+                offers_per_edition: dict[str, list[dict[str, int | float | str]]] = {}
+                for offer in offers:
+                    offers_per_edition.setdefault(get_edition(offer), []).append(offer)
+                for edition, edition_offers in offers_per_edition.items():
+                    self.replace_offers(card_name, edition, edition_offers, scraped_at)
+                self.mark_card_scraped(card_name, scraped_at)
+
+    def export_json(self, offers_database_path: str | Path, sellers_database_path: str | Path):
+        with Path(offers_database_path).open("w") as fp:
+            json.dump(self.get_offers(), fp, indent=2, sort_keys=True)
+        with Path(sellers_database_path).open("w") as fp:
+            json.dump(self.get_sellers(), fp, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["import", "export"], help="Import from or export to the JSON files.")
+    parser.add_argument("--database", "-d", required=True, help="Path to the SQLite database file.")
+    parser.add_argument(
+        "--sellers-database",
+        "-s",
+        default="sellers_database.json",
+        help="Path to the sellers database file (default sellers_database.json).",
+    )
+    parser.add_argument(
+        "--offers-database",
+        "-o",
+        default="offers_database.json",
+        help="Path to the offers database file (default offers_database.json).",
+    )
+    args = parser.parse_args()
+
+    with SqliteStore(args.database) as store:
+        if args.command == "import":
+            store.import_json(args.offers_database, args.sellers_database)
+        else:
+            store.export_json(args.offers_database, args.sellers_database)
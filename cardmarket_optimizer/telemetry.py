@@ -0,0 +1,113 @@
+import json
+import statistics
+import threading
+import time
+from pathlib import Path
+
+# Timing of the steps of a script run, to see where the time goes (page loads, add to cart waits, parsing...) and
+# to compare runs. Each step is a named span:
+#   with telemetry.span("edition load"):
+#       driver.get(url)
+# or, for steps that are long blocks of module-level code:
+#   span = telemetry.span("wizard run")
+#   ...
+#   span.end()
+# Counters (e.g. offers, cards) give the throughput. write_report saves a JSON report of the run:
+#   {"script": ..., "started_at": ..., "duration": ...,
+#    "spans": {"<name>": {"count", "total", "mean", "p50", "p95", "max"}, ...},
+#    "counters": {"<name>": n, ...}, "throughput": {"offers_per_second": ..., "cards_per_minute": ...}}
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class Span:
+    def __init__(self, telemetry: "Telemetry", name: str):
+        self.telemetry = telemetry
+        self.name = name
+        self.start = time.perf_counter()
+        self.ended = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.end()
+
+    def end(self):
+        if not self.ended:
+            self.ended = True
+            self.telemetry.record(self.name, time.perf_counter() - self.start)
+
+
+class Telemetry:
+    """Durations of the spans and counters of a run. Can be used from several threads."""
+
+    def __init__(self, script: str):
+        self.script = script
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.durations: dict[str, list[float]] = {}
+        self.counters: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def span(self, name: str) -> Span:
+        return Span(self, name)
+
+    def record(self, name: str, duration: float):
+        with self.lock:
+            self.durations.setdefault(name, []).append(duration)
+
+    def count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def get_report(self) -> dict:
+        duration = time.perf_counter() - self.start
+        with self.lock:
+            spans = {}
+            for name, durations in self.durations.items():
+                values = sorted(durations)
+                spans[name] = {
+                    "count": len(values),
+                    "total": round(sum(values), 3),
+                    "mean": round(statistics.mean(values), 3),
+                    "p50": round(statistics.median(values), 3),
+                    "p95": round(percentile(values, 0.95), 3),
+                    "max": round(values[-1], 3),
+                }
+            counters = dict(self.counters)
+        throughput = {}
+        if "offers" in counters:
+            throughput["offers_per_second"] = round(counters["offers"] / duration, 3)
+        if "cards" in counters:
+            throughput["cards_per_minute"] = round(counters["cards"] / duration * 60, 3)
+        return {
+            "script": self.script,
+            "started_at": self.started_at,
+            "duration": round(duration, 3),
+            "spans": spans,
+            "counters": counters,
+            "throughput": throughput,
+        }
+
+    def write_report(self, directory: str | Path) -> Path:
+        """Save the report to <directory>/<script>_<start time>.json. Returns its path."""
+        report = self.get_report()
+        path = Path(directory) / f"{self.script}_{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+        return path
+
+    def summary(self) -> str:
+        report = self.get_report()
+        lines = [f"Run time: {report['duration']:.1f}s"]
+        for name, span in sorted(report["spans"].items(), key=lambda x: -x[1]["total"]):
+            lines.append(
+                f"  {name}: {span['count']}x, total {span['total']:.1f}s, p50 {span['p50']:.2f}s, p95 {span['p95']:.2f}s"
+            )
+        for name, value in report["throughput"].items():
+            lines.append(f"  {name}: {value}")
+        return "\n".join(lines)
@@ -1,15 +1,21 @@
 import argparse
 import json
 import re
+import sys
 import time
 from pathlib import Path
+from urllib.parse import urlsplit
 
-from selenium import webdriver
+# driver_factory and telemetry are shared with the Cardmarket scripts. Like those scripts, they import each other as
+# top-level modules, so their directory goes first in the path (before any installed package with the same name).
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "cardmarket_optimizer"))
+
+from driver_factory import create_driver  # type:ignore[import-not-found]
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
-from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select, WebDriverWait
+from telemetry import Telemetry  # type:ignore[import-not-found]
 
 # CLOSE FIREFOX BEFORE RUNNING THIS SCRIPT
 
@@ -147,23 +153,54 @@ def parse_args():
         help="Path to Firefox profile. E.g. "
         r"C:\Users\<user>\AppData\Roaming\Firefox\Profiles\<random_string>.default-release",
     )
+    parser.add_argument("--headless", action="store_true", help="Run Firefox without a window.")
+    parser.add_argument(
+        "--full-browser",
+        action="store_true",
+        help="Load images, media, fonts and other sites' resources (by default they are blocked to load pages faster).",
+    )
+    parser.add_argument(
+        "--base-url",
+        default="https://www.cardtrader.com",
+        help="Address of the site (default https://www.cardtrader.com), e.g. the one of fixture_server.py (in "
+        "cardmarket_optimizer) to serve recorded pages.",
+    )
+    parser.add_argument(
+        "--record-dir",
+        default=None,
+        help="Directory where the visited pages are saved, to replay them with fixture_server.py (default none).",
+    )
+    parser.add_argument(
+        "--telemetry-dir",
+        default="telemetry",
+        help="Directory where the timing report of the run is saved (default telemetry).",
+    )
 
     args = parser.parse_args()
 
     return args
 
 
-args = parse_args()
+def print_reports():
+    print(f"Page load times: {driver.page_load_report()}")
+    print(telemetry.summary())
+    print(f"Timing report saved to {telemetry.write_report(args.telemetry_dir)}")
 
 
-options = Options()
-if args.browser_profile:
-    options.add_argument("-profile")
-    options.add_argument(args.browser_profile)
-driver = webdriver.Firefox(options=options)
+args = parse_args()
+telemetry = Telemetry("cardtrader_optimizer")
+
+driver = create_driver(
+    args.browser_profile,
+    headless=args.headless,
+    lean=not args.full_browser,
+    allowed_hosts=["cardtrader.com", "cloudflare.com", str(urlsplit(args.base_url).hostname)],
+    record_dir=args.record_dir,
+)
 
 # --- Step 0: Click the "Accept" (cookies) button ---
-driver.get("https://www.cardtrader.com/wishlists/new")
+span = telemetry.span("wishlist page")
+driver.get(f"{args.base_url}/wishlists/new")
 
 try:
     accept_button = WebDriverWait(driver, 2).until(
@@ -176,8 +213,10 @@ except Exception:
 # --- Step 1: Click the "Match card printing" checkbox ---
 checkbox = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, "only-identical-copies-checkbox")))
 checkbox.click()
+span.end()
 
 for chunck in split_string_evenly(Path(args.card_list).open("r", encoding="utf-8").read()):
+    span = telemetry.span("wishlist import")
     # --- Step 2: Click the "Paste text" button ---
     paste_button = WebDriverWait(driver, 10).until(
         EC.element_to_be_clickable(
@@ -237,6 +276,7 @@ for chunck in split_string_evenly(Path(args.card_list).open("r", encoding="utf-8
         )
     )
     import_button.click()
+    span.end()
 
 
 # --- Step 7: Select the appropriate settings for each card ---
@@ -455,6 +495,8 @@ def wait_for_optimizer():
     )
     buy_now_link = container.find_element(By.XPATH, ".//a[normalize-space(text())='Buy now']")
     WebDriverWait(driver, 300).until(lambda _: buy_now_link.get_attribute("disabled") is None)
+    # The wishlist with the optimizer's results (the last run is kept).
+    driver.record_page()
     driver.execute_script("window.scrollTo(0, 0);")
     actions = ActionChains(driver)
     actions.move_to_element(buy_now_link).perform()
@@ -531,18 +573,22 @@ def get_prices2():
 cards = {}
 time.sleep(1)
 for idx, language in enumerate(args.language_price_thresholds):
-    set_expansion(args.expansion_choice)
-    set_language(language)
-    set_condition(args.condition)
-    set_foil(args.foil_choice)
-    click_button("'Optimize'" if idx == 0 else "'Refresh'")
-    wait_for_optimizer()
-    cards[language] = get_prices2()
+    with telemetry.span("settings"):
+        set_expansion(args.expansion_choice)
+        set_language(language)
+        set_condition(args.condition)
+        set_foil(args.foil_choice)
+    with telemetry.span("optimizer run"):
+        click_button("'Optimize'" if idx == 0 else "'Refresh'")
+        wait_for_optimizer()
+    with telemetry.span("price read"):
+        cards[language] = get_prices2()
     print(f"cards[{language}]={cards[language]}")
 json.dump(cards, Path("card_prices_by_lang.json").open("w"), indent=2, sort_keys=True)
 
 # If only one language, no need to choose language per card and optimize.
 if len(args.language_price_thresholds) == 1:
+    print_reports()
     exit()
 
 
@@ -660,6 +706,7 @@ for language in args.language_price_thresholds:
 
 
 # --- Step 13: Optimize cards using the chosen language ---
+span = telemetry.span("settings")
 set_expansion(args.expansion_choice)
 set_language(list(args.language_price_thresholds.keys())[0])  # Set to first language as placeholder
 # Find all card rows with required attributes (same as before)
@@ -692,9 +739,13 @@ for row in card_rows:
 
 set_condition(args.condition)
 set_foil(args.foil_choice)
-click_button("'Refresh'")
-wait_for_optimizer()
-cards_optimized = get_prices2()
+span.end()
+with telemetry.span("optimizer run"):
+    click_button("'Refresh'")
+    wait_for_optimizer()
+with telemetry.span("price read"):
+    cards_optimized = get_prices2()
 print(f"{cards_optimized=}")
 print(f"Total optimized by language: {sum(cards_optimized.values())}")
 json.dump(cards_optimized, Path("final_card_prices.json").open("w"), indent=2, sort_keys=True)
+print_reports()